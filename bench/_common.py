@@ -0,0 +1,57 @@
+# bench/_common.py — общая обвязка для офлайн-бенчмарков (временная БД, замеры)
+import os
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+
+
+@asynccontextmanager
+async def temp_db(durability: str | None = None):
+    """Свежая bot.db во временной папке: миграции + пул, после — закрытие."""
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DB_PATH = os.path.join(tmp, "bench.db")
+        if durability:
+            config.DB_DURABILITY = durability
+        await config.init_db()
+        await config.open_db_pool()
+        try:
+            yield config.DB_PATH
+        finally:
+            await config.close_db_pool()
+
+
+def percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+class Timer:
+    def __init__(self) -> None:
+        self.samples: list[float] = []
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.samples.append(time.perf_counter() - self._t0)
+
+    def report(self, name: str, n_ops: int | None = None) -> str:
+        total = sum(self.samples)
+        n = n_ops or len(self.samples)
+        return (
+            f"{name:<28} n={n:<7} total={total:8.3f}s  "
+            f"per-op={total / n * 1e6:9.1f}µs  "
+            f"p50={percentile(self.samples, 50) * 1e6:8.1f}µs  "
+            f"p99={percentile(self.samples, 99) * 1e6:8.1f}µs  "
+            f"ops/s={n / total if total else 0:10.0f}"
+        )
@@ -0,0 +1,102 @@
+# bench/broadcast.py — рассылка одобренной заявки 100k подписчикам через FakeSession
+#
+#   python bench/broadcast.py [--subscribers 100000] [--latency 0.0]
+#
+# 1) без лимита скорости: сколько сообщений/с выдаёт сам broadcaster (БД + gather);
+# 2) та же рассылка с обрывом посередине и resume(): сколько ушло повторно;
+# 3) короткий прогон с BROADCAST_RATE: фактическая скорость должна держаться у лимита.
+import argparse
+import asyncio
+import time
+
+from _common import temp_db
+
+from broadcaster import Broadcaster
+from config import BROADCAST_RATE, db_write
+from fake_telegram import fake_bot
+
+AUTHOR_ID = 7
+REQUEST = {"id": 1, "user_id": AUTHOR_ID, "item_title": "iPhone 13 mini",
+           "description": "синий, 128 ГБ", "photo_file_id": None}
+
+
+def render(row: dict, bot_username: str) -> tuple:
+    return f"Заявка №{row['id']}: {row['item_title']}", None, None
+
+
+async def seed(subscribers: int, req_id: int = 1) -> None:
+    now = "2024-01-01T00:00:00"
+    words = ["*", "iphone", "наушники", "13"]
+    async with db_write() as db:
+        await db.execute(
+            "INSERT INTO requests (id, user_id, private_title, item_title, description, status, created_at) "
+            "VALUES (?, ?, 'p', ?, ?, 'approved', ?)",
+            (req_id, AUTHOR_ID, REQUEST["item_title"], REQUEST["description"], now)
+        )
+        # каждый 4-й подписан на слово, которого в заявке нет; у части — по два подходящих слова
+        await db.executemany(
+            "INSERT INTO seller_subscriptions (keyword, user_id, created_at) VALUES (?, ?, ?)",
+            [(words[uid % 4], 1000 + uid, now) for uid in range(subscribers)]
+            + [("iphone", 1000 + uid, now) for uid in range(0, subscribers, 8)]
+        )
+
+
+async def run_full(subscribers: int, latency: float) -> None:
+    async with temp_db():
+        await seed(subscribers)
+        bot = fake_bot(latency)
+        b = Broadcaster(render, rate=None)
+        t0 = time.perf_counter()
+        total = await b.start(bot, REQUEST)
+        t_snap = time.perf_counter() - t0
+        await b.wait()
+        dt = time.perf_counter() - t0
+        sent = bot.session.count("sendMessage")
+        (p,) = await b.progress(1)
+        print(f"unlimited     recipients={total} snapshot={t_snap * 1e3:.0f}ms sent={sent} "
+              f"in {dt:.2f}s -> {sent / dt:,.0f} msg/s  progress={p['sent']}/{p['total']} {p['status']}")
+
+
+async def run_resume(subscribers: int) -> None:
+    async with temp_db():
+        await seed(subscribers)
+        bot = fake_bot()
+        b = Broadcaster(render, rate=None)
+        total = await b.start(bot, REQUEST)
+        while bot.session.count("sendMessage") < total // 2:
+            await asyncio.sleep(0.01)
+        await b.stop()   # «рестарт» посередине
+        first = bot.session.count("sendMessage")
+        b2 = Broadcaster(render, rate=None)
+        await b2.resume(bot)
+        await b2.wait()
+        delivered = bot.session.count("sendMessage")
+        unique = len({d["chat_id"] for name, d in bot.session.calls if name == "sendMessage"})
+        print(f"resume        stopped at {first}, total sends={delivered}, unique={unique}/{total}, "
+              f"duplicates={delivered - unique} (<= page {b.page_size})")
+
+
+async def run_limited(n: int = 200) -> None:
+    async with temp_db():
+        await seed(n)
+        bot = fake_bot()
+        b = Broadcaster(render)
+        t0 = time.perf_counter()
+        total = await b.start(bot, REQUEST)
+        await b.wait()
+        dt = time.perf_counter() - t0
+        print(f"rate-limited  sent={total} in {dt:.2f}s -> {total / dt:.1f} msg/s (limit {BROADCAST_RATE}/s + burst)")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subscribers", type=int, default=100_000)
+    ap.add_argument("--latency", type=float, default=0.0)
+    args = ap.parse_args()
+    await run_full(args.subscribers, args.latency)
+    await run_resume(args.subscribers)
+    await run_limited()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
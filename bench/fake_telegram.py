@@ -0,0 +1,117 @@
+# bench/fake_telegram.py — офлайн-заглушка Telegram Bot API для бенчмарков
+# FakeSession подменяет HTTP-сессию Bot: ничего не уходит в сеть, все вызовы пишутся в .calls,
+# а ответ собирается по типу __returning__ метода (Message, User, bool…).
+import asyncio
+import itertools
+import time
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import AcceptedGiftTypes, Chat, ChatFullInfo, Message, PhotoSize, Update, User
+
+BOT_ID = 42
+BOT_USERNAME = "bench_bot"
+FAKE_TOKEN = f"{BOT_ID}:AAAA-fake-token-for-benchmarks-only"
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency           # имитация RTT до api.telegram.org
+        self.calls: list[tuple[str, dict]] = []
+        self._msg_ids = itertools.count(1_000_000)
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    def _result(self, method):
+        returning = getattr(method, "__returning__", None)
+        if returning is User:
+            return User(id=BOT_ID, is_bot=True, first_name="Bench", username=BOT_USERNAME)
+        if returning is ChatFullInfo:
+            chat_id = method.chat_id if isinstance(method.chat_id, int) else 0
+            return ChatFullInfo(
+                id=chat_id, type="channel" if chat_id < 0 else "private", title=f"chat {chat_id}",
+                accent_color_id=0, max_reaction_count=0,
+                # набор полей меняется между версиями Bot API — все флаги выключены
+                accepted_gift_types=AcceptedGiftTypes(**dict.fromkeys(AcceptedGiftTypes.model_fields, False)),
+            )
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            photo = None
+            if getattr(method, "photo", None) is not None:
+                photo = [PhotoSize(file_id=f"fake-photo-{next(self._msg_ids)}", file_unique_id="u",
+                                   width=100, height=100, file_size=1000)]
+            return Message(
+                message_id=next(self._msg_ids),
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                photo=photo,
+            )
+        return True
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append((method.__api_method__, method.model_dump(exclude_none=True)))
+        return self._result(method)
+
+    def count(self, api_method: str) -> int:
+        return sum(1 for name, _ in self.calls if name == api_method)
+
+
+def fake_bot(latency: float = 0.0) -> Bot:
+    return Bot(FAKE_TOKEN, session=FakeSession(latency))
+
+
+# ---- генераторы апдейтов ----
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(uid: int) -> dict:
+    return {"id": uid, "is_bot": False, "first_name": f"u{uid}"}
+
+
+def message_update(uid: int, text: str | None = None, chat_id: int | None = None, photo: bool = False) -> dict:
+    msg = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": chat_id if chat_id is not None else uid, "type": "private" if chat_id is None else "supergroup"},
+        "from": _user(uid),
+    }
+    if text is not None:
+        msg["text"] = text
+    if photo:
+        msg["photo"] = [{"file_id": f"in-photo-{uid}", "file_unique_id": f"u{uid}", "width": 90, "height": 90,
+                         "file_size": 1000}]
+    return {"update_id": next(_update_ids), "message": msg}
+
+
+def callback_update(uid: int, data: str, chat_id: int | None = None) -> dict:
+    cid = chat_id if chat_id is not None else uid
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(uid),
+            "chat_instance": str(cid),
+            "data": data,
+            "message": {
+                "message_id": next(_message_ids),
+                "date": int(time.time()),
+                "chat": {"id": cid, "type": "private" if chat_id is None else "supergroup"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+                "text": "card",
+            },
+        },
+    }
+
+
+def as_update(raw: dict, bot: Bot) -> Update:
+    return Update.model_validate(raw, context={"bot": bot})
+
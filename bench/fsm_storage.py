@@ -0,0 +1,45 @@
+# bench/fsm_storage.py — накладные расходы FSM-хранилища на один апдейт: MemoryStorage vs SqliteStorage
+# Запуск: python bench/fsm_storage.py [кол-во апдейтов]
+import asyncio
+import sys
+
+from _common import Timer, temp_db
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from fsm_storage import SqliteStorage
+
+USERS = 200
+
+
+async def one_update(storage, key: StorageKey, i: int) -> None:
+    # примерно то, что делает шаг мастера: FSM-middleware читает состояние,
+    # хендлер читает черновик, дописывает поле и переключает состояние
+    await storage.get_state(key)
+    await storage.get_data(key)
+    await storage.update_data(key, {f"draft_{i % 4}": "x" * 40})
+    await storage.set_state(key, f"RequestCreate:step_{i % 4}")
+
+
+async def run(storage, n: int) -> Timer:
+    keys = [StorageKey(bot_id=1, chat_id=u, user_id=u) for u in range(USERS)]
+    t = Timer()
+    for i in range(n):
+        with t:
+            await one_update(storage, keys[i % USERS], i)
+    return t
+
+
+async def main(n: int) -> None:
+    print(f"updates={n} users={USERS}")
+    mem = await run(MemoryStorage(), n)
+    print(mem.report("MemoryStorage"))
+    for durability in ("balanced", "safe"):
+        async with temp_db(durability):
+            sql = await run(SqliteStorage(), n)
+        print(sql.report(f"SqliteStorage[{durability}]"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
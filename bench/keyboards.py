@@ -0,0 +1,51 @@
+# bench/keyboards.py — сборка клавиатур на горячих путях меню: каждый раз заново vs из кэша
+# Запуск: python bench/keyboards.py [кол-во вызовов]
+import sys
+import time
+import tracemalloc
+
+import _common  # noqa: F401  (путь к корню репозитория)
+
+import main
+
+# что строится на типичных апдейтах: меню, «Мои запросы», помощь, слайдер, модерация
+HOT_PATHS = [
+    ("menu_keyboard", ()),
+    ("requests_keyboard", ()),
+    ("help_keyboard", ()),
+    ("start_keyboard", ()),
+    ("confirm_or_change_kb", ()),
+    ("slider_kb", (1, 10, 12345)),
+    ("admin_moderation_kb", (12345,)),
+]
+
+
+def measure(build, args, n: int) -> tuple[float, float]:
+    """(мкс на вызов, пик аллокаций одного вызова в байтах)"""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        build(*args)
+    per_call_us = (time.perf_counter() - t0) / n * 1e6
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for _ in range(100):
+        build(*args)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return per_call_us, peak
+
+
+def main_bench(n: int) -> None:
+    main.warm_keyboards()
+    print(f"{'keyboard':<24}{'fresh µs':>10}{'cached µs':>11}{'fresh peak B':>14}{'cached peak B':>15}")
+    for name, args in HOT_PATHS:
+        cached = getattr(main, name)
+        fresh_us, fresh_b = measure(cached.__wrapped__, args, n)
+        cached_us, cached_b = measure(cached, args, n)
+        print(f"{name:<24}{fresh_us:>10.2f}{cached_us:>11.3f}{fresh_b:>14.0f}{cached_b:>15.0f}")
+
+
+if __name__ == "__main__":
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,198 @@
+# bench/load.py — сквозная нагрузка на настоящий Dispatcher (public_router + mod_router) без сети
+#
+#   python bench/load.py [--buyers 300] [--sellers 3] [--concurrency 64] [--latency 0.0]
+#                        [--storage sqlite|memory] [--durability fast|balanced|safe] [--rate-limit]
+#
+# Апдейты собираются из сырых dict (как их присылает Telegram) и идут через dp.feed_update,
+# т.е. через все фильтры, FSM-middleware и хендлеры; Bot API — FakeSession (ответы пишутся в .calls).
+# Фазы идут по очереди, внутри фазы — много пользователей параллельно, шаги одного пользователя
+# строго друг за другом (как в реальном чате):
+#   1) онбординг: /start + «Принимаю» и мастер RequestCreate до «Отправить на модерацию»;
+#   2) модерация: одобрение (каждая 5-я заявка — отклонение с причиной);
+#   3) отклики: /start offer_<id> -> цена -> дни -> состояние -> «Пропустить» от нескольких продавцов.
+# Итог: p50/p99 на каждый шаг, апдейтов/с по фазам и в целом, счётчики в БД и вызовов API.
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from _common import percentile, temp_db
+
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+import main
+from config import MODERATION_CHAT_ID, db_read
+from fake_telegram import as_update, callback_update, fake_bot, message_update
+from metrics import METRICS
+
+BUYER_BASE = 100_000
+SELLER_BASE = 200_000
+MODERATOR_BASE = 900_000
+REJECT_EVERY = 5
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.unhandled: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.order: list[str] = []
+
+    def add(self, step: str, seconds: float) -> None:
+        if step not in self.samples:
+            self.order.append(step)
+        self.samples[step].append(seconds)
+
+    def total(self) -> int:
+        return sum(len(s) for s in self.samples.values())
+
+    def report(self) -> list[str]:
+        out = [f"{'step':<26} {'n':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        for step in self.order:
+            s = self.samples[step]
+            extra = ""
+            if self.unhandled[step]:
+                extra += f"  unhandled={self.unhandled[step]}"
+            if self.errors[step]:
+                extra += f"  errors={self.errors[step]}"
+            out.append(f"{step:<26} {len(s):>6} {percentile(s, 50) * 1e3:8.2f} "
+                       f"{percentile(s, 99) * 1e3:8.2f} {max(s) * 1e3:8.2f}{extra}")
+        return out
+
+
+class Driver:
+    """Кормит dp апдейтами и замеряет каждый feed_update."""
+
+    def __init__(self, dp, bot, rec: Recorder) -> None:
+        self.dp, self.bot, self.rec = dp, bot, rec
+
+    async def feed(self, step: str, raw: dict) -> None:
+        upd = as_update(raw, self.bot)
+        t0 = time.perf_counter()
+        try:
+            result = await self.dp.feed_update(self.bot, upd)
+        except Exception as e:
+            self.rec.errors[step] += 1
+            if self.rec.errors[step] == 1:
+                print(f"[load] {step} failed: {e!r}")
+            result = None
+        self.rec.add(step, time.perf_counter() - t0)
+        if result is UNHANDLED:
+            self.rec.unhandled[step] += 1
+
+    # ---- сценарии одного пользователя ----
+    async def buyer(self, uid: int, n: int) -> None:
+        await self.feed("/start", message_update(uid, "/start"))
+        await self.feed("accept offer", callback_update(uid, main.ACCEPT_CALLBACK_DATA))
+        await self.feed("req: new", message_update(uid, "Создать новый запрос"))
+        await self.feed("req: private title", message_update(uid, f"Подарок {n}"))
+        await self.feed("req: item title", message_update(uid, f"iPhone 13 mini модель{n}"))
+        await self.feed("req: description", message_update(uid, "синий, 128 ГБ, новый, с чеком"))
+        await self.feed("req: skip photo", callback_update(uid, main.CB_REQ_SKIP_PHOTO))
+        await self.feed("req: confirm", callback_update(uid, main.CB_REQ_CONFIRM))
+
+    async def moderate(self, moderator: int, req_id: int) -> None:
+        if req_id % REJECT_EVERY:
+            await self.feed("mod: approve", callback_update(moderator, f"adm:ok:{req_id}", MODERATION_CHAT_ID))
+            return
+        await self.feed("mod: reject", callback_update(moderator, f"adm:rej:{req_id}", MODERATION_CHAT_ID))
+        await self.feed("mod: reject reason", message_update(moderator, "Нет фото и размера", MODERATION_CHAT_ID))
+
+    async def seller(self, uid: int, req_id: int, n: int) -> None:
+        await self.feed("/start offer_<id>", message_update(uid, f"/start offer_{req_id}"))
+        await self.feed("offer: price", message_update(uid, str(10_000 + n * 37 % 5000)))
+        await self.feed("offer: days", message_update(uid, str(3 + n % 20)))
+        await self.feed("offer: condition", callback_update(uid, f"offer:cond:{1 + n % 10}"))
+        await self.feed("offer: skip photo", callback_update(uid, main.CB_OFFER_SKIP_PHOTO))
+
+
+async def run_phase(name: str, jobs: list, concurrency: int, rec: Recorder) -> str:
+    """jobs — фабрики корутин (по одной на пользователя); параллельно не больше concurrency."""
+    sem = asyncio.Semaphore(concurrency)
+    before = rec.total()
+
+    async def one(factory) -> None:
+        async with sem:
+            await factory()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(f) for f in jobs))
+    dt = time.perf_counter() - t0
+    n = rec.total() - before
+    return f"{name:<12} updates={n:<7} {dt:7.2f}s  {n / dt if dt else 0:8.0f} upd/s"
+
+
+async def db_counts() -> dict:
+    async with db_read() as db:
+        cur = await db.execute("SELECT status, COUNT(*) AS n FROM requests GROUP BY status")
+        counts = {r["status"]: r["n"] for r in await cur.fetchall()}
+        cur = await db.execute("SELECT COUNT(*) AS n FROM offers")
+        counts["offers"] = (await cur.fetchone())["n"]
+    return counts
+
+
+async def run(args) -> None:
+    main.FSM_STORAGE = args.storage
+    async with temp_db(args.durability):
+        main.PROFILE_WRITER.start()
+        bot = fake_bot(args.latency)
+        if args.rate_limit:
+            main.setup_bot_session(bot)
+        main.OUTBOX.start()
+        dp = main.build_dispatcher()
+        rec = Recorder()
+        drv = Driver(dp, bot, rec)
+
+        t0 = time.perf_counter()
+        phases = [await run_phase(
+            "requests", [lambda i=i: drv.buyer(BUYER_BASE + i, i) for i in range(args.buyers)],
+            args.concurrency, rec)]
+
+        async with db_read() as db:
+            cur = await db.execute("SELECT id FROM requests WHERE status='pending' ORDER BY id")
+            pending = [r["id"] for r in await cur.fetchall()]
+        # у каждого модератора своё FSM-состояние (ожидание причины) — один модератор на задачу
+        phases.append(await run_phase(
+            "moderation", [lambda i=i, r=r: drv.moderate(MODERATOR_BASE + i, r) for i, r in enumerate(pending)],
+            args.concurrency, rec))
+
+        approved = [r for r in pending if r % REJECT_EVERY]
+        phases.append(await run_phase(
+            "offers", [lambda i=i, r=r, k=k: drv.seller(SELLER_BASE + k * len(approved) + i, r, i)
+                       for k in range(args.sellers) for i, r in enumerate(approved)],
+            args.concurrency, rec))
+        elapsed = time.perf_counter() - t0
+
+        await asyncio.gather(*main.PUBLISH_TASKS)   # публикации идут в фоне после ответа модератору
+        await main.OUTBOX.stop()
+        await main.PROFILE_WRITER.stop()
+        counts = await db_counts()
+
+    calls = defaultdict(int)
+    for name, _ in bot.session.calls:
+        calls[name] += 1
+
+    print(f"buyers={args.buyers} sellers/request={args.sellers} concurrency={args.concurrency} "
+          f"latency={args.latency * 1e3:.0f}ms storage={args.storage} rate_limit={args.rate_limit}")
+    for line in rec.report():
+        print(line)
+    for line in phases:
+        print(line)
+    total = rec.total()
+    print(f"{'total':<12} updates={total:<7} {elapsed:7.2f}s  {total / elapsed:8.0f} upd/s")
+    print(f"db: {counts}")
+    print(f"api calls: {dict(sorted(calls.items()))}")
+    if main.METRICS_ENABLED:
+        print(METRICS.summary_lines()[-1])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--buyers", type=int, default=300)
+    ap.add_argument("--sellers", type=int, default=3, help="откликов на каждую одобренную заявку")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--latency", type=float, default=0.0, help="имитация RTT Bot API, секунды")
+    ap.add_argument("--storage", choices=("sqlite", "memory"), default="sqlite")
+    ap.add_argument("--durability", choices=("fast", "balanced", "safe"), default=None)
+    ap.add_argument("--rate-limit", action="store_true", help="включить RateLimitMiddleware на сессии")
+    asyncio.run(run(ap.parse_args()))
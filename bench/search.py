@@ -0,0 +1,95 @@
+# bench/search.py — поиск по заявкам: FTS5 (search_requests) против LIKE-скана
+#
+#   python bench/search.py [--rows 200000] [--repeat 20]
+#
+# Заявки синтетические: название из словаря + описание; часть слов редкие, часть частые.
+import argparse
+import asyncio
+import random
+
+from _common import Timer, temp_db
+
+from config import db_read, db_write
+import main
+
+COMMON = ["iphone", "чехол", "кроссовки", "куртка", "часы", "наушники", "сумка", "платье"]
+RARE = [f"модель{i}" for i in range(2000)]
+FILLER = ["новый", "б/у", "оригинал", "размер", "цвет", "чёрный", "белый", "срочно", "доставка", "торг"]
+
+# без ранжирования: свежие сначала, каждое слово — в названии или описании
+LIKE_SQL = """
+    SELECT id, item_title, description, photo_file_id, status
+      FROM requests
+     WHERE status = 'approved' AND {where}
+     ORDER BY id DESC
+     LIMIT ? OFFSET ?
+"""
+
+
+async def seed(n: int) -> None:
+    rnd = random.Random(1)
+    batch = []
+    async with db_write() as db:
+        for i in range(n):
+            title = f"{rnd.choice(COMMON)} {rnd.choice(RARE)}"
+            desc = " ".join(rnd.choice(FILLER) for _ in range(12))
+            batch.append((i % 5000, "p", title, desc, "approved" if i % 3 else "pending", "2024-01-01"))
+            if len(batch) == 10_000:
+                await db.executemany(
+                    "INSERT INTO requests (user_id, private_title, item_title, description, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            await db.executemany(
+                "INSERT INTO requests (user_id, private_title, item_title, description, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+
+async def like_search(term: str, offset: int = 0, limit: int = main.SEARCH_PAGE_SIZE) -> list:
+    words = term.split()
+    where = " AND ".join("(item_title LIKE ? OR description LIKE ?)" for _ in words)
+    params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+    async with db_read() as db:
+        cur = await db.execute(LIKE_SQL.format(where=where), (*params, limit, offset))
+        return await cur.fetchall()
+
+
+async def bench(rows: int, repeat: int) -> None:
+    async with temp_db():
+        t = Timer()
+        with t:
+            await seed(rows)
+        print(t.report(f"seed {rows} rows (+fts triggers)", rows))
+
+        cases = [("редкое слово", "модель1234"), ("частое слово", "наушники"),
+                 ("два слова", "iphone модель77"), ("префикс", "кроссов"), ("нет совпадений", "самолёт")]
+        for name, term in cases:
+            fts, like = Timer(), Timer()
+            for _ in range(repeat):
+                with fts:
+                    found, _ = await main.search_requests(term)
+                with like:
+                    await like_search(term)
+            print(fts.report(f"fts  {name}", repeat) + f"  hits={len(found)}")
+            print(like.report(f"like {name}", repeat))
+
+        # 100-я страница по курсору против OFFSET у LIKE
+        cursor = None
+        for _ in range(99):
+            _, cursor = await main.search_requests("наушники", cursor)
+        deep, deep_like = Timer(), Timer()
+        for _ in range(repeat):
+            with deep:
+                await main.search_requests("наушники", cursor)
+            with deep_like:
+                await like_search("наушники", offset=99 * main.SEARCH_PAGE_SIZE)
+        print(deep.report("fts  частое, 100-я стр.", repeat))
+        print(deep_like.report("like частое, 100-я стр.", repeat))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    asyncio.run(bench(args.rows, args.repeat))
@@ -0,0 +1,53 @@
+# bench/update_metrics.py — проверка учёта БД в метриках: чтение состояния FSM относится к апдейту
+#
+#   python bench/update_metrics.py [--updates 50]
+#
+# Настоящий build_dispatcher + SqliteStorage: «Помощь» сама в БД не ходит (доступ в кэше), поэтому
+# всё, что насчитано на on_help, — чтение состояния FSMContextMiddleware. Если контекст метрик
+# открывается после FSM, эти запросы уходят в "background" — тогда выход с кодом 1.
+import argparse
+import asyncio
+import sys
+
+from _common import temp_db
+
+import main
+from fake_telegram import as_update, callback_update, fake_bot, message_update
+from metrics import METRICS
+
+UID = 100_000
+
+
+async def run(args) -> int:
+    main.FSM_STORAGE = "sqlite"
+    async with temp_db():
+        main.PROFILE_WRITER.start()
+        bot = fake_bot()
+        dp = main.build_dispatcher()
+
+        async def feed(raw: dict) -> None:
+            await dp.feed_update(bot, as_update(raw, bot))
+
+        await feed(message_update(UID, "/start"))
+        await feed(callback_update(UID, main.ACCEPT_CALLBACK_DATA))
+        await main.PROFILE_WRITER.flush()
+
+        background = METRICS.background.queries
+        for _ in range(args.updates):
+            await feed(message_update(UID, "Помощь"))
+        await main.PROFILE_WRITER.stop()
+
+    h = METRICS.handlers.get("on_help")
+    n = h.latency.count if h else 0
+    per_update = h.queries.sum / n if n else 0.0
+    leaked = METRICS.background.queries - background
+    print(f"on_help: n={n} db={per_update:.1f}q per update; background +{leaked} queries")
+    ok = n == args.updates and per_update >= 1 and leaked == 0
+    print("ok" if ok else "FAIL: чтение состояния FSM не попало в метрики апдейта")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=50)
+    sys.exit(asyncio.run(run(ap.parse_args())))
@@ -0,0 +1,76 @@
+# bench/webhook.py — пропускная способность webhook-режима без сети:
+# поднимаем настоящий aiohttp-сервер на localhost с FakeSession вместо Telegram и шлём ему апдейты.
+# Запуск: python bench/webhook.py [кол-во апдейтов] [параллельность]
+import asyncio
+import sys
+import time
+
+from _common import percentile, temp_db
+
+import aiohttp
+from aiohttp import web
+
+import main
+import webhook_server
+from config import WEBHOOK_PATH
+from fake_telegram import fake_bot, message_update
+
+SECRET = "bench-secret"
+USERS = 500
+
+
+async def run(n: int, concurrency: int) -> None:
+    async with temp_db("fast"):
+        main.PROFILE_WRITER.start()
+        for uid in range(1, USERS + 1):
+            await main.set_accepted(uid)
+
+        bot = fake_bot()
+        dp = main.build_dispatcher()
+        app = webhook_server.build_webhook_app(dp, bot, secret_token=SECRET)
+        handler = app["webhook_handler"]
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+
+        texts = ["Помощь", "Мои запросы", "Вернуться", "Мой профиль", "/start"]
+        payloads = [message_update(1 + i % USERS, texts[i % len(texts)]) for i in range(n)]
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        post_lat: list[float] = []
+        queue = iter(payloads)
+
+        async with aiohttp.ClientSession() as http:
+            async with http.post(url, json=payloads[0], headers={"X-Telegram-Bot-Api-Secret-Token": "bad"}) as r:
+                assert r.status == 401, f"secret check failed: {r.status}"
+
+            async def worker():
+                for payload in queue:
+                    t0 = time.perf_counter()
+                    async with http.post(url, json=payload, headers=headers) as r:
+                        await r.read()
+                    post_lat.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            while handler.in_flight:
+                await asyncio.sleep(0.005)
+            elapsed = time.perf_counter() - t0
+
+            async with http.get(f"http://127.0.0.1:{port}{webhook_server.HEALTH_PATH}") as r:
+                health = await r.json()
+
+        await runner.cleanup()   # заодно проверяем drain при остановке
+        await main.PROFILE_WRITER.stop()
+
+    print(f"updates={n} concurrency={concurrency} elapsed={elapsed:.2f}s "
+          f"throughput={n / elapsed:.0f} upd/s")
+    print(f"POST latency p50={percentile(post_lat, 50) * 1e3:.2f}ms p99={percentile(post_lat, 99) * 1e3:.2f}ms")
+    print(f"outbound API calls={len(bot.session.calls)} health={health}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+                    int(sys.argv[2]) if len(sys.argv) > 2 else 32))
@@ -0,0 +1,78 @@
+# botinfo.py — кто мы и куда пишем: id/@username бота и сведения о каналах публикации и модерации
+#
+# Заполняется один раз в main() (load) и кладётся в workflow-данные диспетчера (dp["bot_info"]),
+# хендлеры получают его аргументом bot_info. Раньше каждое одобрение звало get_me ради @username
+# в ссылке «Откликнуться» — лишний поход в Bot API на горячем пути модерации.
+# Обновление ленивое: при обращении после BOT_INFO_TTL отдаём то, что есть, и в фоне перечитываем.
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from config import BOT_INFO_TTL, MODERATION_CHAT_ID, PUBLISH_CHANNEL_ID
+
+
+class BotInfo:
+    def __init__(self, chat_ids: tuple[int, ...] = (PUBLISH_CHANNEL_ID, MODERATION_CHAT_ID),
+                 ttl: float = BOT_INFO_TTL) -> None:
+        self.chat_ids = chat_ids
+        self.ttl = ttl
+        self.id: int | None = None
+        self.username: str | None = None
+        self.chats: dict[int, dict] = {}   # chat_id -> {"id", "type", "title", "username"}
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.failures = 0
+
+    async def load(self, bot: Bot) -> None:
+        """get_me обязателен (ошибка — наверх); недоступный чат только логируем, прежние данные остаются."""
+        me = await bot.get_me()
+        chats = dict(self.chats)
+        for chat_id in self.chat_ids:
+            try:
+                c = await bot.get_chat(chat_id)
+                chats[chat_id] = {"id": c.id, "type": c.type, "title": c.title, "username": c.username}
+            except TelegramAPIError as e:
+                print(f"[botinfo] get_chat {chat_id} failed: {e}")
+        self.id, self.username, self.chats = me.id, me.username, chats
+        self.loaded_at = time.monotonic()
+        self.refreshes += 1
+
+    async def _refresh(self, bot: Bot) -> None:
+        try:
+            await self.load(bot)
+        except Exception as e:
+            self.failures += 1
+            self.loaded_at = time.monotonic()   # следующая попытка — через ttl, а не на каждом апдейте
+            print(f"[botinfo] refresh failed: {e!r}")
+        finally:
+            self._task = None
+
+    async def get(self, bot: Bot) -> "BotInfo":
+        if self.username is None:
+            # не загружен (бенчмарки без main(), неудачный старт) — грузим один раз на всех
+            async with self._lock:
+                if self.username is None:
+                    await self.load(bot)
+        elif self._task is None and time.monotonic() - self.loaded_at > self.ttl:
+            self._task = asyncio.create_task(self._refresh(bot))
+        return self
+
+    def chat_title(self, chat_id: int) -> str:
+        c = self.chats.get(chat_id)
+        return (c and (c["title"] or (c["username"] and f"@{c['username']}"))) or str(chat_id)
+
+    def summary(self) -> str:
+        chats = ", ".join(f"{cid}: {self.chat_title(cid)}" for cid in self.chat_ids)
+        return f"@{self.username} id={self.id}; чаты: {chats}"
+
+    def stats(self) -> dict:
+        return {
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else -1,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "chats_resolved": len(self.chats),
+        }
@@ -0,0 +1,184 @@
+# broadcaster.py — рассылка одобренной заявки подписанным продавцам (DM с кнопкой «Откликнуться»)
+#
+# При одобрении список получателей один раз снимается в broadcast_recipients, дальше идём
+# страницами по user_id: страница отправляется параллельно (BROADCAST_CONCURRENCY) под общим
+# лимитом BROADCAST_RATE, после страницы прогресс (курсор, sent/failed) коммитится.
+# После рестарта resume() продолжает незавершённые рассылки с курсора — повторно может
+# уйти максимум одна недосланная страница.
+import asyncio
+import re
+from datetime import datetime
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+
+from botinfo import BotInfo
+from config import BROADCAST_PAGE_SIZE, BROADCAST_CONCURRENCY, BROADCAST_RATE, db_read, db_write
+from sender import TokenBucket, mark_background
+
+ALL_KEYWORD = "*"
+_WORD_RE = re.compile(r"\w+")
+
+
+def keyword_tokens(text: str) -> list[str]:
+    """Слова в нижнем регистре от 2 символов — одинаково для заявок и для подписок."""
+    return [w for w in _WORD_RE.findall(text.lower()) if 2 <= len(w) <= 32]
+
+
+def request_keywords(row: dict) -> list[str]:
+    """Слова заявки, по которым ищем подписки (+ '*' — подписка на всё)."""
+    words = set(keyword_tokens(f"{row.get('item_title') or ''} {row.get('description') or ''}"))
+    return [ALL_KEYWORD, *sorted(words)[:500]]
+
+
+# render(row, bot_username) -> (text, reply_markup, photo_file_id | None)
+Render = Callable[[dict, str], tuple]
+
+
+class Broadcaster:
+    def __init__(self, render: Render, page_size: int = BROADCAST_PAGE_SIZE,
+                 concurrency: int = BROADCAST_CONCURRENCY, rate: float | None = BROADCAST_RATE,
+                 bot_info: BotInfo | None = None) -> None:
+        self.render = render
+        self.bot_info = bot_info   # @username из кэша; без него — bot.me()
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate, rate) if rate else None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    # ---- запуск / восстановление ----
+    async def start(self, bot: Bot, row: dict) -> int:
+        """Снимает получателей и запускает рассылку в фоне; возвращает число получателей."""
+        req_id = row["id"]
+        keywords = request_keywords(row)
+        marks = ",".join("?" * len(keywords))
+        async with db_write() as db:
+            cur = await db.execute(
+                "INSERT OR IGNORE INTO broadcasts (request_id, created_at) VALUES (?, ?)",
+                (req_id, datetime.utcnow().isoformat())
+            )
+            if cur.rowcount == 0:   # уже запускали (повторное одобрение/двойной клик)
+                return 0
+            cur = await db.execute(
+                f"""
+                INSERT OR IGNORE INTO broadcast_recipients (request_id, user_id)
+                SELECT ?, user_id FROM seller_subscriptions
+                 WHERE keyword IN ({marks}) AND user_id != ?
+                """,
+                (req_id, *keywords, row["user_id"])
+            )
+            total = cur.rowcount
+            await db.execute("UPDATE broadcasts SET total=? WHERE request_id=?", (total, req_id))
+        self._spawn(bot, req_id)
+        return total
+
+    async def resume(self, bot: Bot) -> int:
+        async with db_read() as db:
+            cur = await db.execute("SELECT request_id FROM broadcasts WHERE status='running'")
+            ids = [r["request_id"] for r in await cur.fetchall()]
+        for req_id in ids:
+            self._spawn(bot, req_id)
+        if ids:
+            print(f"[broadcast] resumed {len(ids)} broadcast(s): {ids}")
+        return len(ids)
+
+    def _spawn(self, bot: Bot, req_id: int) -> None:
+        if req_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(bot, req_id))
+        self._tasks[req_id] = task
+        task.add_done_callback(lambda _t, rid=req_id: self._tasks.pop(rid, None))
+
+    async def stop(self) -> None:
+        # прогресс уже в БД, при следующем старте resume() продолжит
+        for t in list(self._tasks.values()):
+            t.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def wait(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    # ---- сама рассылка ----
+    async def _send_one(self, bot: Bot, sem: asyncio.Semaphore, user_id: int,
+                        text: str, kb, photo_id: str | None) -> bool:
+        async with sem:
+            if self.bucket:
+                wait = self.bucket.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                if photo_id:
+                    await bot.send_photo(user_id, photo_id, caption=text, reply_markup=kb)
+                else:
+                    await bot.send_message(user_id, text, reply_markup=kb)
+                return True
+            except TelegramForbiddenError:
+                return False   # продавец заблокировал бота
+            except TelegramAPIError as e:
+                print(f"[broadcast] dm {user_id} failed: {e}")
+                return False
+
+    async def _run(self, bot: Bot, req_id: int) -> None:
+        mark_background()
+        try:
+            async with db_read() as db:
+                cur = await db.execute("SELECT * FROM requests WHERE id=?", (req_id,))
+                row = await cur.fetchone()
+                cur = await db.execute("SELECT cursor_user_id FROM broadcasts WHERE request_id=?", (req_id,))
+                b = await cur.fetchone()
+            if not row or not b:
+                await self._finish(req_id)
+                return
+            me = await self.bot_info.get(bot) if self.bot_info else await bot.me()
+            text, kb, photo_id = self.render(dict(row), me.username)
+            cursor = b["cursor_user_id"]
+            sem = asyncio.Semaphore(self.concurrency)
+
+            while True:
+                async with db_read() as db:
+                    cur = await db.execute(
+                        "SELECT user_id FROM broadcast_recipients WHERE request_id=? AND user_id>? "
+                        "ORDER BY user_id LIMIT ?",
+                        (req_id, cursor, self.page_size)
+                    )
+                    page = [r["user_id"] for r in await cur.fetchall()]
+                if not page:
+                    break
+                results = await asyncio.gather(
+                    *(self._send_one(bot, sem, uid, text, kb, photo_id) for uid in page)
+                )
+                ok = sum(results)
+                cursor = page[-1]
+                async with db_write() as db:
+                    await db.execute(
+                        "UPDATE broadcasts SET cursor_user_id=?, sent=sent+?, failed=failed+? WHERE request_id=?",
+                        (cursor, ok, len(page) - ok, req_id)
+                    )
+                    await db.execute(
+                        "DELETE FROM broadcast_recipients WHERE request_id=? AND user_id<=?", (req_id, cursor)
+                    )
+            await self._finish(req_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[broadcast] #{req_id} crashed (will resume on restart): {e!r}")
+
+    async def _finish(self, req_id: int) -> None:
+        async with db_write() as db:
+            await db.execute(
+                "UPDATE broadcasts SET status='done', finished_at=? WHERE request_id=?",
+                (datetime.utcnow().isoformat(), req_id)
+            )
+            await db.execute("DELETE FROM broadcast_recipients WHERE request_id=?", (req_id,))
+
+    # ---- прогресс ----
+    async def progress(self, limit: int = 5) -> list[dict]:
+        async with db_read() as db:
+            cur = await db.execute(
+                "SELECT request_id, status, total, sent, failed, created_at, finished_at "
+                "FROM broadcasts ORDER BY request_id DESC LIMIT ?",
+                (limit,)
+            )
+            return [dict(r) for r in await cur.fetchall()]
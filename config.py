@@ -1,4 +1,9 @@
 # config.py — все константы и БД (aiogram v3)
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
 import aiosqlite
 
 # ====== ТОКЕН БОТА ======
@@ -14,6 +19,8 @@ START_IMAGE_URL = ""  # например: "https://example.com/start.png"
 # Группа/беседа модерации (куда падают заявки) и канал публикаций
 MODERATION_CHAT_ID = -5004252082
 PUBLISH_CHANNEL_ID = -1003026579376
+# Сведения о боте и этих чатах (botinfo.py) читаются при старте; перечитывать не чаще раза в N секунд
+BOT_INFO_TTL = 3600
 
 # ====== СТАРТОВЫЕ INLINE-КНОПКИ (2 ссылки) ======
 BUTTONS = [
@@ -40,92 +47,625 @@ HELP_NEWS_USERNAME    = "someout"
 HELP_OFFERS_USERNAME  = "someout_offers"
 HELP_ADS_USERNAME     = "makintoshit"
 
+# ====== РЕЖИМ ЗАПУСКА ======
+# "polling" — long polling (один процесс); "webhook" — aiohttp-сервер, Telegram шлёт апдейты сам
+# (можно держать несколько воркеров за балансировщиком)
+RUN_MODE = "polling"
+# Публичный https-адрес, на который Telegram шлёт апдейты: WEBHOOK_BASE_URL + WEBHOOK_PATH
+WEBHOOK_BASE_URL = ""  # например: "https://bot.example.com"
+WEBHOOK_PATH     = "/tg/webhook"
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (обязателен в режиме webhook; A-Z a-z 0-9 _ -)
+WEBHOOK_SECRET   = ""
+# Где слушает сам сервер
+WEBHOOK_HOST     = "0.0.0.0"
+WEBHOOK_PORT     = 8080
+# Вызывать setWebhook при старте (при нескольких воркерах — включить только у одного)
+WEBHOOK_SET_ON_START = True
+# Сколько секунд при остановке ждать уже принятые апдейты
+WEBHOOK_DRAIN_TIMEOUT = 30
+
+# ====== ОЧЕРЁДНОСТЬ ВХОДЯЩИХ АПДЕЙТОВ (ordering.py) ======
+# Апдейты одного пользователя в одном чате — строго по очереди (двойной тап, быстрые ответы
+# в мастере); разные пользователи — параллельно, но одновременно в хендлерах не больше N (0 — без лимита)
+SERIALIZE_UPDATES  = True
+UPDATE_CONCURRENCY = 64
+
+# ====== ИСХОДЯЩИЕ СООБЩЕНИЯ (лимиты Telegram) ======
+# Всего сообщений в секунду на бота (у Telegram ~30/с) и запас на всплеск
+OUTBOUND_GLOBAL_RATE  = 25
+OUTBOUND_GLOBAL_BURST = 25
+# В один личный чат — ~1/с (короткий всплеск допустим)
+OUTBOUND_CHAT_RATE    = 1.0
+OUTBOUND_CHAT_BURST   = 3
+# В группу/канал — до 20 в минуту
+OUTBOUND_GROUP_RATE   = 20 / 60
+OUTBOUND_GROUP_BURST  = 5
+# Повторы при 429/сетевых ошибках; фоновые воркеры и размер очереди уведомлений
+OUTBOUND_MAX_RETRIES  = 5
+OUTBOUND_WORKERS      = 4
+OUTBOUND_QUEUE_SIZE   = 10_000
+
+# ====== ПОДПИСКИ ПРОДАВЦОВ И РАССЫЛКА ОДОБРЕННЫХ ЗАЯВОК ======
+# Сколько ключевых слов может держать один продавец
+SUBSCRIPTIONS_PER_USER = 20
+# Получателей за одну страницу рассылки (после каждой страницы прогресс пишется в БД)
+BROADCAST_PAGE_SIZE    = 500
+# Одновременных отправок внутри страницы
+BROADCAST_CONCURRENCY  = 16
+# Потолок скорости рассылки (сообщений/с) — ниже OUTBOUND_GLOBAL_RATE, чтобы ответам
+# в чатах оставался запас
+BROADCAST_RATE         = 20
+
+# ====== ОЧЕРЕДЬ МОДЕРАЦИИ (/queue в чате модерации) ======
+QUEUE_PAGE_SIZE           = 8    # заявок на странице очереди
+QUEUE_BATCH_MAX           = 50   # сколько можно отметить за раз (одна транзакция, один отчёт)
+QUEUE_PUBLISH_CONCURRENCY = 4    # одновременных публикаций в канал (лимиты — в RateLimitMiddleware)
+
+# ====== ПОИСК ПО ЗАЯВКАМ (FTS5) ======
+SEARCH_PAGE_SIZE        = 5    # /search: результатов на страницу
+SEARCH_INLINE_PAGE_SIZE = 20   # inline-режим: результатов на порцию (Telegram — не больше 50)
+
+# ====== ОТКЛИКИ НА ЗАЯВКУ (экран «Отклики» у автора) ======
+OFFERS_PAGE_SIZE = 5
+
+# ====== ДАЙДЖЕСТ ОТКЛИКОВ АВТОРУ ======
+# Первый отклик автору — сразу, следующие в течение окна копятся и уходят одним сообщением
+# («5 новых откликов, лучшая цена …»). 0 — каждый отклик отдельным сообщением.
+OFFER_DIGEST_WINDOW = 300   # секунд
+
+# ====== ФОНОВЫЕ ЗАДАЧИ ОБСЛУЖИВАНИЯ (scheduler.py) ======
+REQUEST_PENDING_TTL_DAYS  = 14   # не промодерированная заявка -> 'expired'
+REQUEST_APPROVED_TTL_DAYS = 30   # опубликованная заявка -> 'closed' (отклики больше не принимаются)
+ARCHIVE_AFTER_DAYS        = 30   # закрытые (expired/closed/rejected) старше — в архивные таблицы
+MAINTENANCE_BATCH         = 500  # строк на транзакцию: писатель не держит блокировку долго
+JOB_EXPIRE_INTERVAL       = 3600       # секунд между запусками
+JOB_ARCHIVE_INTERVAL      = 6 * 3600
+JOB_FSM_PURGE_INTERVAL    = 3600
+
+# ====== МЕТРИКИ (metrics.py) ======
+METRICS_ENABLED      = True
+METRICS_PATH         = "/metrics"   # Prometheus-текст в webhook-режиме (тот же aiohttp-сервер)
+METRICS_LOG_INTERVAL = 300          # сводка в лог раз в N секунд (0 — выключено)
+
 # ====== ПУТЬ К БАЗЕ ДАННЫХ ======
 DB_PATH = "bot.db"
 
+# ====== АРХИВНАЯ БД ======
+# Закрытые заявки и их отклики (scheduler.archive_closed_requests) лежат в отдельном файле,
+# подключённом к каждому соединению как схема "archive": bot.db остаётся маленьким,
+# а архив можно бэкапить реже. None — "archive.db" рядом с DB_PATH.
+ARCHIVE_DB_PATH: str | None = None
+
+# ====== ПУЛ СОЕДИНЕНИЙ С БД ======
+# Соединений на чтение (запись всегда идёт через одно отдельное соединение)
+DB_POOL_SIZE       = 4
+# Кэш подготовленных выражений на каждое соединение (sqlite3 cached_statements)
+DB_STATEMENT_CACHE = 256
+
+# ====== НАСТРОЙКИ SQLITE (профиль надёжности) ======
+# Применяются к каждому соединению (init_db + пул).
+#   "safe"     — WAL + fsync на каждый commit (synchronous=FULL)
+#   "balanced" — WAL + synchronous=NORMAL: fsync только на чекпоинтах, при сбое питания
+#                можно потерять последние коммиты, но не целостность БД
+#   "fast"     — без fsync вообще (тесты/бенчмарки)
+DB_DURABILITY = "balanced"
+DB_PRAGMA_PROFILES = {
+    "safe":     {"journal_mode": "WAL", "synchronous": "FULL"},
+    "balanced": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+    "fast":     {"journal_mode": "WAL", "synchronous": "OFF"},
+}
+# Общие для всех профилей (cache_size < 0 — в КиБ, mmap_size — в байтах, busy_timeout — в мс)
+DB_PRAGMAS_COMMON = {
+    "busy_timeout": 5000,
+    "cache_size":   -16000,
+    "mmap_size":    128 * 1024 * 1024,
+    "temp_store":   "MEMORY",
+}
+
+# ====== IN-PROCESS КЭШИ ======
+# Флаг «оферта принята»: сколько пользователей держать в памяти и сколько помнить «ещё не принял»
+# (положительный ответ не меняется, поэтому живёт до вытеснения; отрицательный — коротко,
+#  на случай если принятие прошло через другой процесс)
+ACCEPTED_CACHE_SIZE         = 50_000
+ACCEPTED_CACHE_NEGATIVE_TTL = 60
+
+# Ключи идемпотентности отправки заявки/отклика: сколько помнить в памяти уже обработанные
+# (повторная доставка апдейта, двойной тап) — дальше дубль всё равно отсекает UNIQUE в БД
+SUBMIT_DEDUP_CACHE_SIZE = 20_000
+SUBMIT_DEDUP_TTL        = 600
+
+# ====== ОТЛОЖЕННАЯ ЗАПИСЬ first_seen (ensure_profile) ======
+# Новые профили копятся в памяти и пишутся одной транзакцией раз в N мс или по M штук
+PROFILE_FLUSH_INTERVAL_MS = 250
+PROFILE_FLUSH_MAX_ITEMS   = 200
+# Сколько user_id «профиль уже есть в БД» помнить (для них ensure_profile ничего не пишет)
+PROFILE_KNOWN_CACHE_SIZE  = 100_000
+
+# ====== КЭШ ЭКРАНА ПРОФИЛЯ (get_profile_view) ======
+# Сбрасывается любой записью в профиль/заявки/отклики пользователя; TTL — страховка
+# на случай записи из другого процесса
+PROFILE_VIEW_CACHE_SIZE = 10_000
+PROFILE_VIEW_CACHE_TTL  = 300
+
+# ====== КЭШ КЛАВИАТУР ======
+# Сколько вариантов параметризованных клавиатур (слайдер, модерация, отклик) держать в памяти
+KEYBOARD_CACHE_SIZE = 4096
+
+# ====== FSM-ХРАНИЛИЩЕ ======
+# "sqlite" — состояния/черновики в bot.db (переживают рестарт, общие для нескольких процессов)
+# "memory" — MemoryStorage aiogram (только один процесс, всё теряется при рестарте)
+FSM_STORAGE   = "sqlite"
+# Черновик без активности дольше стольких секунд считается брошенным
+FSM_DRAFT_TTL = 7 * 24 * 3600
+
+
+# ======================================================================
+# PRAGMA-профиль (WAL, synchronous, кэш, mmap...) — на каждое соединение
+# ======================================================================
+def db_pragmas() -> dict:
+    if DB_DURABILITY not in DB_PRAGMA_PROFILES:
+        raise RuntimeError(f"Неизвестный DB_DURABILITY={DB_DURABILITY!r}, варианты: {', '.join(DB_PRAGMA_PROFILES)}")
+    # busy_timeout ставим первым — следующие PRAGMA уже ждут блокировку, а не падают
+    return {**DB_PRAGMAS_COMMON, **DB_PRAGMA_PROFILES[DB_DURABILITY]}
+
+
+async def apply_pragmas(db: aiosqlite.Connection) -> dict:
+    """Применяет профиль и возвращает фактические значения (как их видит SQLite)."""
+    pragmas = db_pragmas()
+    for name, value in pragmas.items():
+        await db.execute(f"PRAGMA {name}={value}")
+    effective = {}
+    for name in pragmas:
+        cur = await db.execute(f"PRAGMA {name}")
+        row = await cur.fetchone()
+        effective[name] = row[0] if row else None
+    return effective
+
+
+# ======================================================================
+# АРХИВНАЯ БД: ATTACH на каждое соединение + её схема
+# ======================================================================
+def archive_db_path() -> str:
+    return ARCHIVE_DB_PATH or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archive.db")
+
+
+async def attach_archive(db: aiosqlite.Connection) -> None:
+    await db.execute("ATTACH DATABASE ? AS archive", (archive_db_path(),))
+    # журнал и fsync — по тому же профилю, что и у основной БД
+    profile = DB_PRAGMA_PROFILES[DB_DURABILITY]
+    await db.execute(f"PRAGMA archive.journal_mode={profile['journal_mode']}")
+    await db.execute(f"PRAGMA archive.synchronous={profile['synchronous']}")
+
+
+async def ensure_archive_schema(db: aiosqlite.Connection) -> None:
+    # у архива своей версии нет: схема только добавляется, CREATE ... IF NOT EXISTS хватает
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive.requests_archive (
+            id            INTEGER PRIMARY KEY,
+            user_id       INTEGER NOT NULL,
+            private_title TEXT NOT NULL,
+            item_title    TEXT NOT NULL,
+            description   TEXT NOT NULL,
+            photo_file_id TEXT,
+            status        TEXT NOT NULL,
+            created_at    TEXT NOT NULL,
+            moderated_at  TEXT,
+            reject_reason TEXT,
+            closed_at     TEXT,
+            archived_at   TEXT
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive.offers_archive (
+            id            INTEGER PRIMARY KEY,
+            request_id    INTEGER NOT NULL,
+            seller_id     INTEGER NOT NULL,
+            price         REAL    NOT NULL,
+            days          INTEGER NOT NULL,
+            cond          INTEGER NOT NULL,
+            photo_file_id TEXT,
+            created_at    TEXT    NOT NULL
+        )
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS archive.idx_requests_archive_user_id ON requests_archive(user_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS archive.idx_offers_archive_seller_id ON offers_archive(seller_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS archive.idx_offers_archive_request_id ON offers_archive(request_id)")
+    await db.commit()
+
 
 # ======================================================================
 # ИНИЦИАЛИЗАЦИЯ/МИГРАЦИИ БАЗЫ ДАННЫХ (идемпотентно, вызывать при старте)
 # ======================================================================
 async def init_db() -> None:
     """
-    Создаёт таблицы при первом запуске и дотягивает недостающие колонки при обновлениях.
-    Безопасно вызывать на каждом старте.
+    Применяет PRAGMA-профиль и докатывает схему до последней версии (PRAGMA user_version).
+    Безопасно вызывать на каждом старте: на актуальной БД это одно чтение user_version.
     """
     async with aiosqlite.connect(DB_PATH) as db:
-        # ---- user_profile: профили пользователей/статистика/контакты/реквизиты ----
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS user_profile (
-                user_id        INTEGER PRIMARY KEY,
-
-                -- флаг принятой оферты (чтобы не спрашивать заново)
-                accepted       INTEGER NOT NULL DEFAULT 0,
-
-                -- первый вход (UTC, ISO-8601)
-                first_seen     TEXT,
-
-                -- контактные данные (CDEK)
-                cdek_fio       TEXT,
-                cdek_phone     TEXT,
-                cdek_address   TEXT,
-
-                -- реквизиты для выплат
-                payout_fio     TEXT,
-                payout_card    TEXT,
-                payout_bank    TEXT,
-
-                -- устаревшие свободные поля (на случай совместимости)
-                cdek_text      TEXT,
-                payout_text    TEXT
-            )
-            """
+        db.row_factory = aiosqlite.Row
+        effective = await apply_pragmas(db)
+        print(f"[db] {DB_PATH}: profile={DB_DURABILITY} " + " ".join(f"{k}={v}" for k, v in effective.items()))
+
+        await attach_archive(db)
+        await ensure_archive_schema(db)
+        print(f"[db] archive: {archive_db_path()}")
+
+        version = await run_migrations(db)
+        print(f"[db] schema version={version}")
+
+
+async def _user_version(db: aiosqlite.Connection) -> int:
+    cur = await db.execute("PRAGMA user_version")
+    (version,) = await cur.fetchone()
+    return int(version)
+
+
+async def run_migrations(db: aiosqlite.Connection) -> int:
+    """
+    Применяет MIGRATIONS[user_version:] по одной, каждую в своей транзакции.
+    BEGIN IMMEDIATE + повторное чтение версии — чтобы два процесса не мигрировали одновременно.
+    """
+    version = await _user_version(db)
+    while version < len(MIGRATIONS):
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            version = await _user_version(db)
+            if version >= len(MIGRATIONS):
+                await db.rollback()
+                break
+            await MIGRATIONS[version](db)
+            version += 1
+            await db.execute(f"PRAGMA user_version={version}")
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        print(f"[db] migrated to v{version}")
+    return version
+
+
+# ---- v1: базовая схема + дотягивание колонок у БД, созданных до версионирования ----
+async def _m001_base_schema(db: aiosqlite.Connection) -> None:
+    # ---- user_profile: профили пользователей/статистика/контакты/реквизиты ----
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_profile (
+            user_id        INTEGER PRIMARY KEY,
+
+            -- флаг принятой оферты (чтобы не спрашивать заново)
+            accepted       INTEGER NOT NULL DEFAULT 0,
+
+            -- первый вход (UTC, ISO-8601)
+            first_seen     TEXT,
+
+            -- контактные данные (CDEK)
+            cdek_fio       TEXT,
+            cdek_phone     TEXT,
+            cdek_address   TEXT,
+
+            -- реквизиты для выплат
+            payout_fio     TEXT,
+            payout_card    TEXT,
+            payout_bank    TEXT,
+
+            -- устаревшие свободные поля (на случай совместимости)
+            cdek_text      TEXT,
+            payout_text    TEXT
         )
+        """
+    )
 
-        # ---- requests: заявки пользователей ----
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS requests (
-                id            INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id       INTEGER NOT NULL,
-                private_title TEXT NOT NULL,
-                item_title    TEXT NOT NULL,
-                description   TEXT NOT NULL,
-                photo_file_id TEXT,
-                status        TEXT NOT NULL DEFAULT 'pending',
-                created_at    TEXT NOT NULL,
-                moderated_at  TEXT,
-                reject_reason TEXT
-            )
-            """
+    # ---- requests: заявки пользователей ----
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS requests (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id       INTEGER NOT NULL,
+            private_title TEXT NOT NULL,
+            item_title    TEXT NOT NULL,
+            description   TEXT NOT NULL,
+            photo_file_id TEXT,
+            status        TEXT NOT NULL DEFAULT 'pending',
+            created_at    TEXT NOT NULL,
+            moderated_at  TEXT,
+            reject_reason TEXT
         )
+        """
+    )
+
+    # ---- offers: отклики продавцов на заявки ----
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS offers (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id    INTEGER NOT NULL,
+            seller_id     INTEGER NOT NULL,
+            price         REAL    NOT NULL,
+            days          INTEGER NOT NULL,
+            cond          INTEGER NOT NULL,   -- 1..10
+            photo_file_id TEXT,
+            created_at    TEXT    NOT NULL
+        )
+        """
+    )
+
+    await _migrate_user_profile(db)
+    await _migrate_requests(db)
+    await _migrate_offers(db)
+
+
+# ---- v2: индексы под фильтры по автору, статусу модерации и заявке отклика ----
+async def _m002_indexes(db: aiosqlite.Connection) -> None:
+    # id — это rowid, поэтому (user_id) уже отдаёт строки в порядке id и покрывает ORDER BY id
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_requests_user_id ON requests(user_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_request_id ON offers(request_id)")
+
+
+# ---- v3: индекс под агрегаты продавца на экране профиля ----
+async def _m003_offers_seller_index(db: aiosqlite.Connection) -> None:
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_seller_id ON offers(seller_id)")
+
+
+# ---- v4: FSM-хранилище (fsm_storage.SqliteStorage) ----
+async def _m004_fsm_state(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key        TEXT PRIMARY KEY,
+            state      TEXT,
+            data       TEXT,               -- компактный JSON
+            updated_at INTEGER NOT NULL    -- unix time, для TTL
+        )
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_updated_at ON fsm_state(updated_at)")
+
+
+# ---- v5: file_id уже загруженных в Telegram файлов (стартовая картинка и т.п.) ----
+async def _m005_media_cache(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_cache (
+            source     TEXT NOT NULL,    -- абсолютный путь или URL
+            digest     TEXT NOT NULL,    -- sha256 содержимого ('' для URL)
+            file_id    TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (source, digest)
+        )
+        """
+    )
+
+
+# ---- v6: подписки продавцов по ключевым словам + состояние рассылок ----
+async def _m006_subscriptions(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS seller_subscriptions (
+            keyword    TEXT    NOT NULL,   -- слово в нижнем регистре, '*' — все заявки
+            user_id    INTEGER NOT NULL,
+            created_at TEXT    NOT NULL,
+            PRIMARY KEY (keyword, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_seller_subscriptions_user ON seller_subscriptions(user_id)")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            request_id     INTEGER PRIMARY KEY,
+            status         TEXT    NOT NULL DEFAULT 'running',   -- running / done
+            total          INTEGER NOT NULL DEFAULT 0,
+            sent           INTEGER NOT NULL DEFAULT 0,
+            failed         INTEGER NOT NULL DEFAULT 0,
+            cursor_user_id INTEGER NOT NULL DEFAULT 0,           -- до кого уже дошли
+            created_at     TEXT    NOT NULL,
+            finished_at    TEXT
+        )
+        """
+    )
+    # снимок получателей на момент одобрения; обработанные страницы удаляются
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            request_id INTEGER NOT NULL,
+            user_id    INTEGER NOT NULL,
+            PRIMARY KEY (request_id, user_id)
+        ) WITHOUT ROWID
+        """
+    )
+
 
-        # ---- offers: отклики продавцов на заявки ----
-        await db.execute(
-            """
-            CREATE TABLE IF NOT EXISTS offers (
-                id            INTEGER PRIMARY KEY AUTOINCREMENT,
-                request_id    INTEGER NOT NULL,
-                seller_id     INTEGER NOT NULL,
-                price         REAL    NOT NULL,
-                days          INTEGER NOT NULL,
-                cond          INTEGER NOT NULL,   -- 1..10
-                photo_file_id TEXT,
-                created_at    TEXT    NOT NULL
-            )
-            """
+# ---- v7: полнотекстовый индекс по названию и описанию заявок ----
+async def _m007_requests_fts(db: aiosqlite.Connection) -> None:
+    # external content: текст хранится только в requests, FTS держит лишь индекс;
+    # синхронизация — триггерами, существующие строки индексируются через 'rebuild'
+    await db.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+            item_title, description,
+            content='requests', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
         )
+        """
+    )
+    # по одному execute: executescript сам коммитит и сломал бы транзакцию миграции
+    await db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_fts_ai AFTER INSERT ON requests BEGIN
+            INSERT INTO requests_fts (rowid, item_title, description)
+            VALUES (new.id, new.item_title, new.description);
+        END
+        """
+    )
+    await db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_fts_ad AFTER DELETE ON requests BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, item_title, description)
+            VALUES ('delete', old.id, old.item_title, old.description);
+        END
+        """
+    )
+    await db.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS requests_fts_au AFTER UPDATE OF item_title, description ON requests BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, item_title, description)
+            VALUES ('delete', old.id, old.item_title, old.description);
+            INSERT INTO requests_fts (rowid, item_title, description)
+            VALUES (new.id, new.item_title, new.description);
+        END
+        """
+    )
+    await db.execute("INSERT INTO requests_fts (requests_fts) VALUES ('rebuild')")
 
-        # --- миграции ---
-        await _migrate_user_profile(db)
-        await _migrate_requests(db)
-        await _migrate_offers(db)
 
-        await db.commit()
+# ---- v8: составные индексы под экран «Отклики» (сортировка в SQL, keyset-страницы) ----
+# Выражение «лучшие» (цена с надбавкой 2%/день срока и 5%/балл состояния ниже 10) main.py
+# подставляет в запрос этой же строкой: индекс по выражению SQLite узнаёт только при точном совпадении.
+OFFER_SCORE_EXPR = "price * (1 + 0.02 * days) * (1 + 0.05 * (10 - cond))"
 
 
+async def _m008_offers_ranking_indexes(db: aiosqlite.Connection) -> None:
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_req_price ON offers(request_id, price, id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_req_days  ON offers(request_id, days, id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_req_cond  ON offers(request_id, -cond, id)")
+    await db.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_offers_req_score ON offers(request_id, ({OFFER_SCORE_EXPR}), id)"
+    )
+    # префикс request_id есть у всех новых индексов — одиночный из v2 больше не нужен
+    await db.execute("DROP INDEX IF EXISTS idx_offers_request_id")
+
+
+# ---- v9: накопленные уведомления об откликах (переживают рестарт) ----
+async def _m009_offer_digests(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS offer_digests (
+            author_id       INTEGER PRIMARY KEY,
+            due_at          INTEGER NOT NULL,             -- unix: когда закрывается окно
+            pending         INTEGER NOT NULL DEFAULT 0,   -- откликов ждёт дайджеста
+            best_price      REAL,
+            best_request_id INTEGER,
+            request_ids     TEXT                          -- '12,15' — заявки с новыми откликами
+        )
+        """
+    )
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offer_digests_due ON offer_digests(due_at)")
+
+
+# ---- v10: закрытие заявок по сроку + холодные таблицы для закрытых заявок и их откликов ----
+REQUEST_COLUMNS = ("id, user_id, private_title, item_title, description, photo_file_id, "
+                   "status, created_at, moderated_at, reject_reason, closed_at")
+OFFER_COLUMNS = "id, request_id, seller_id, price, days, cond, photo_file_id, created_at"
+
+
+async def _m010_request_lifecycle(db: aiosqlite.Connection) -> None:
+    cur = await db.execute("PRAGMA table_info(requests)")
+    if "closed_at" not in {r[1] for r in await cur.fetchall()}:
+        await db.execute("ALTER TABLE requests ADD COLUMN closed_at TEXT")
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS requests_archive (
+            id            INTEGER PRIMARY KEY,
+            user_id       INTEGER NOT NULL,
+            private_title TEXT NOT NULL,
+            item_title    TEXT NOT NULL,
+            description   TEXT NOT NULL,
+            photo_file_id TEXT,
+            status        TEXT NOT NULL,
+            created_at    TEXT NOT NULL,
+            moderated_at  TEXT,
+            reject_reason TEXT,
+            closed_at     TEXT
+        )
+        """
+    )
+    await db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS offers_archive (
+            id            INTEGER PRIMARY KEY,
+            request_id    INTEGER NOT NULL,
+            seller_id     INTEGER NOT NULL,
+            price         REAL    NOT NULL,
+            days          INTEGER NOT NULL,
+            cond          INTEGER NOT NULL,
+            photo_file_id TEXT,
+            created_at    TEXT    NOT NULL
+        )
+        """
+    )
+    # под агрегаты экрана профиля (он считает и архив)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_requests_archive_user_id ON requests_archive(user_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_offers_archive_seller_id ON offers_archive(seller_id)")
+
+
+# ---- v11: архивные таблицы из bot.db переезжают в архивную БД (схема archive) ----
+async def _m011_move_archive_out(db: aiosqlite.Connection) -> None:
+    # в WAL коммит атомарен по каждой БД отдельно: если упадём между ними, строки окажутся
+    # в обеих — повтор миграции это переживёт (INSERT OR IGNORE), а чтение идёт из archive
+    await db.execute(
+        f"INSERT OR IGNORE INTO archive.requests_archive ({REQUEST_COLUMNS}) "
+        f"SELECT {REQUEST_COLUMNS} FROM main.requests_archive"
+    )
+    await db.execute(
+        f"INSERT OR IGNORE INTO archive.offers_archive ({OFFER_COLUMNS}) "
+        f"SELECT {OFFER_COLUMNS} FROM main.offers_archive"
+    )
+    await db.execute("DROP TABLE IF EXISTS main.requests_archive")
+    await db.execute("DROP TABLE IF EXISTS main.offers_archive")
+
+
+# ---- v12: ключи идемпотентности (черновик FSM / апдейт) — повтор отправки не создаёт дубль ----
+async def _m012_idempotency_keys(db: aiosqlite.Connection) -> None:
+    for table in ("requests", "offers"):
+        cur = await db.execute(f"PRAGMA table_info({table})")
+        if "idem_key" not in {r[1] for r in await cur.fetchall()}:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN idem_key TEXT")
+    # NULL у старых строк уникальности не мешает (в UNIQUE-индексе NULL-ы различны)
+    await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_idem_key ON requests(idem_key)")
+    await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_offers_idem_key ON offers(idem_key)")
+
+
+# ---- v13: отметка публикации в канал — одобренные, но не опубликованные допубликуются на старте ----
+async def _m013_published_at(db: aiosqlite.Connection) -> None:
+    cur = await db.execute("PRAGMA table_info(requests)")
+    if "published_at" not in {r[1] for r in await cur.fetchall()}:
+        await db.execute("ALTER TABLE requests ADD COLUMN published_at TEXT")
+    # всё, что одобрили до этой версии, уже в канале
+    await db.execute(
+        "UPDATE requests SET published_at = COALESCE(moderated_at, created_at)"
+        " WHERE status IN ('approved', 'closed', 'expired') AND published_at IS NULL"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_requests_unpublished ON requests(id)"
+        " WHERE status = 'approved' AND published_at IS NULL"
+    )
+
+
+# Порядок менять нельзя: номер миграции = позиция в списке + 1 (хранится в user_version)
+MIGRATIONS = [
+    _m001_base_schema,
+    _m002_indexes,
+    _m003_offers_seller_index,
+    _m004_fsm_state,
+    _m005_media_cache,
+    _m006_subscriptions,
+    _m007_requests_fts,
+    _m008_offers_ranking_indexes,
+    _m009_offer_digests,
+    _m010_request_lifecycle,
+    _m011_move_archive_out,
+    _m012_idempotency_keys,
+    _m013_published_at,
+]
+
+
+# ---- шаги v1 для старых схем (раньше запускались на каждом старте) ----
 async def _migrate_user_profile(db: aiosqlite.Connection) -> None:
-    db.row_factory = aiosqlite.Row
     cur = await db.execute("PRAGMA table_info(user_profile)")
     cols = {row["name"] for row in await cur.fetchall()}
 
@@ -150,7 +690,6 @@ async def _migrate_user_profile(db: aiosqlite.Connection) -> None:
 
 
 async def _migrate_requests(db: aiosqlite.Connection) -> None:
-    db.row_factory = aiosqlite.Row
     cur = await db.execute("PRAGMA table_info(requests)")
     cols = {row["name"] for row in await cur.fetchall()}
 
@@ -166,7 +705,6 @@ async def _migrate_requests(db: aiosqlite.Connection) -> None:
 
 
 async def _migrate_offers(db: aiosqlite.Connection) -> None:
-    db.row_factory = aiosqlite.Row
     cur = await db.execute("PRAGMA table_info(offers)")
     cols = {row["name"] for row in await cur.fetchall()}
     # Сейчас все колонки создаются сразу; блок ниже — страховка на будущее
@@ -186,3 +724,182 @@ async def _migrate_offers(db: aiosqlite.Connection) -> None:
             await db.execute("ALTER TABLE offers ADD COLUMN request_id INTEGER NOT NULL DEFAULT 0")
         elif c == "seller_id":
             await db.execute("ALTER TABLE offers ADD COLUMN seller_id INTEGER NOT NULL DEFAULT 0")
+
+
+# ======================================================================
+# НАБЛЮДАТЕЛЬ ЗА БД: счётчики запросов/соединений/времени в SQLite (metrics.py)
+# ======================================================================
+# Наблюдатель — любой объект с on_checkout(kind), on_query(seconds), on_time(seconds).
+# Пока он не установлен, пул отдаёт соединения как есть — без обёрток и накладных расходов.
+_db_observer = None
+
+
+def set_db_observer(observer) -> None:
+    global _db_observer
+    _db_observer = observer
+
+
+class _ObservedCursor:
+    __slots__ = ("_cur", "_obs")
+
+    def __init__(self, cur, obs) -> None:
+        self._cur = cur
+        self._obs = obs
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    async def _timed(self, coro):
+        t0 = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self._obs.on_time(time.perf_counter() - t0)
+
+    def fetchone(self):
+        return self._timed(self._cur.fetchone())
+
+    def fetchall(self):
+        return self._timed(self._cur.fetchall())
+
+    def fetchmany(self, size=None):
+        return self._timed(self._cur.fetchmany(size) if size is not None else self._cur.fetchmany())
+
+
+class _ObservedConnection:
+    """Обёртка соединения из пула: execute/executemany считаются запросами, fetch*/commit — временем."""
+
+    __slots__ = ("_db", "_obs")
+
+    def __init__(self, db: aiosqlite.Connection, obs) -> None:
+        self._db = db
+        self._obs = obs
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    async def execute(self, sql, parameters=None):
+        t0 = time.perf_counter()
+        try:
+            cur = await (self._db.execute(sql) if parameters is None else self._db.execute(sql, parameters))
+        finally:
+            self._obs.on_query(time.perf_counter() - t0)
+        return _ObservedCursor(cur, self._obs)
+
+    async def executemany(self, sql, parameters):
+        t0 = time.perf_counter()
+        try:
+            cur = await self._db.executemany(sql, parameters)
+        finally:
+            self._obs.on_query(time.perf_counter() - t0)
+        return _ObservedCursor(cur, self._obs)
+
+
+# ======================================================================
+# ПУЛ СОЕДИНЕНИЙ (открывается один раз в main(), закрывается при выходе)
+# ======================================================================
+class DbPool:
+    """
+    Долгоживущие соединения: DB_POOL_SIZE читателей + один писатель.
+    Чтение идёт параллельно, запись сериализуется и коммитится при выходе из блока.
+    """
+
+    def __init__(self, path: str | None = None, size: int = DB_POOL_SIZE) -> None:
+        self.path = path or DB_PATH
+        self.size = max(1, size)
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._conns: list[aiosqlite.Connection] = []
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path, cached_statements=DB_STATEMENT_CACHE)
+        db.row_factory = aiosqlite.Row
+        for name, value in db_pragmas().items():
+            await db.execute(f"PRAGMA {name}={value}")
+        await attach_archive(db)
+        self._conns.append(db)
+        return db
+
+    async def open(self) -> None:
+        for _ in range(self.size):
+            self._readers.put_nowait(await self._connect())
+        self._writer = await self._connect()
+
+    async def close(self) -> None:
+        async with self._write_lock:
+            for db in self._conns:
+                try:
+                    await db.close()
+                except Exception as e:
+                    print(f"[db-pool] close failed: {e}")
+            self._conns.clear()
+            self._writer = None
+
+    @asynccontextmanager
+    async def read(self):
+        db = await self._readers.get()
+        obs = _db_observer
+        try:
+            if obs is None:
+                yield db
+            else:
+                obs.on_checkout("read")
+                yield _ObservedConnection(db, obs)
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._write_lock:
+            db = self._writer
+            if db is None:
+                raise RuntimeError("Пул БД закрыт")
+            obs = _db_observer
+            if obs is not None:
+                obs.on_checkout("write")
+            try:
+                yield db if obs is None else _ObservedConnection(db, obs)
+            except BaseException:
+                await db.rollback()
+                raise
+            else:
+                t0 = time.perf_counter()
+                await db.commit()
+                if obs is not None:
+                    obs.on_time(time.perf_counter() - t0)
+
+
+_pool: DbPool | None = None
+
+
+async def open_db_pool() -> DbPool:
+    global _pool
+    if _pool is None:
+        pool = DbPool()
+        await pool.open()
+        _pool = pool
+    return _pool
+
+
+async def close_db_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _require_pool() -> DbPool:
+    if _pool is None:
+        raise RuntimeError("Пул БД не открыт — вызовите open_db_pool() в main()")
+    return _pool
+
+
+def db_read():
+    """async with db_read() as db: ... — соединение на чтение из пула."""
+    return _require_pool().read()
+
+
+def db_write():
+    """async with db_write() as db: ... — общее соединение на запись (commit при выходе)."""
+    return _require_pool().write()
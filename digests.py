@@ -0,0 +1,105 @@
+# digests.py — уведомления автору об откликах: первый сразу, остальные — дайджестом раз в окно
+#
+# Состояние окна — в таблице offer_digests (миграция v9), поэтому накопленное после рестарта
+# не теряется: фоновый цикл отдаст всё, у чего подошёл due_at. Сама отправка — снаружи
+# (deliver кладёт сообщение в очередь OUTBOX), здесь только учёт.
+import asyncio
+import time
+from typing import Callable
+
+from aiogram import Bot
+
+from config import OFFER_DIGEST_WINDOW, db_write
+
+MAX_REQUEST_IDS = 10
+
+
+class OfferDigest:
+    def __init__(self, deliver: Callable[[Bot, dict], None], window: int = OFFER_DIGEST_WINDOW) -> None:
+        self.deliver = deliver
+        self.bot: Bot | None = None
+        self.window = window
+        self.tick = max(1.0, min(5.0, window / 4))
+        self._task: asyncio.Task | None = None
+        self.immediate = 0
+        self.coalesced = 0
+        self.digests = 0
+
+    async def add(self, author_id: int, request_id: int, price: float) -> bool:
+        """Учитывает отклик. True — окна нет, уведомить автора сразу; False — уйдёт в дайджесте."""
+        if self.window <= 0:
+            self.immediate += 1
+            return True
+        now = int(time.time())
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute("SELECT * FROM offer_digests WHERE author_id=?", (author_id,))
+            row = await cur.fetchone()
+            if row is None or (row["due_at"] <= now and row["pending"] == 0):
+                # тишина: этот отклик — сразу, следующие в окне копим
+                await db.execute(
+                    "INSERT OR REPLACE INTO offer_digests (author_id, due_at, pending) VALUES (?, ?, 0)",
+                    (author_id, now + self.window)
+                )
+                self.immediate += 1
+                return True
+            ids = row["request_ids"].split(",") if row["request_ids"] else []
+            if str(request_id) not in ids and len(ids) < MAX_REQUEST_IDS:
+                ids.append(str(request_id))
+            better = row["best_price"] is None or price < row["best_price"]
+            await db.execute(
+                "UPDATE offer_digests SET pending=pending+1, best_price=?, best_request_id=?, request_ids=? "
+                "WHERE author_id=?",
+                (price if better else row["best_price"], request_id if better else row["best_request_id"],
+                 ",".join(ids), author_id)
+            )
+        self.coalesced += 1
+        return False
+
+    async def flush_due(self, bot: Bot | None = None) -> int:
+        """Отдаёт дайджесты с истёкшим окном; возвращает, сколько отправлено."""
+        bot = bot or self.bot
+        now = int(time.time())
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute("SELECT * FROM offer_digests WHERE due_at<=?", (now,))
+            rows = [dict(r) for r in await cur.fetchall()]
+            if not rows:
+                return 0
+            # пустые окна закрываем, после дайджеста открываем новое — чтобы поток откликов
+            # и дальше шёл не чаще раза в окно
+            await db.execute("DELETE FROM offer_digests WHERE due_at<=? AND pending=0", (now,))
+            await db.execute(
+                "UPDATE offer_digests SET pending=0, best_price=NULL, best_request_id=NULL, request_ids=NULL, "
+                "due_at=? WHERE due_at<=? AND pending>0",
+                (now + self.window, now)
+            )
+        ready = [r for r in rows if r["pending"] > 0]
+        for r in ready:
+            r["request_ids"] = [int(x) for x in r["request_ids"].split(",")] if r["request_ids"] else []
+            self.deliver(bot, r)
+        self.digests += len(ready)
+        return len(ready)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.flush_due()
+            except Exception as e:
+                print(f"[digest] flush failed: {e!r}")
+            await asyncio.sleep(self.tick)
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        if self.window > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        # недоотправленное остаётся в offer_digests и уйдёт после старта
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"immediate": self.immediate, "coalesced": self.coalesced, "digests": self.digests}
@@ -0,0 +1,118 @@
+# fsm_storage.py — FSM-хранилище aiogram поверх той же SQLite (вместо MemoryStorage)
+# Состояния и черновики переживают рестарт, и несколько процессов бота на одном bot.db
+# видят одно и то же (WAL + busy_timeout из config).
+import json
+import time
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from config import FSM_DRAFT_TTL, db_read, db_write
+
+
+def _dumps(data: Mapping[str, Any]) -> str | None:
+    # компактный JSON без пробелов и \u-экранирования кириллицы; пустой словарь — NULL
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False) if data else None
+
+
+def _loads(raw: str | None) -> dict[str, Any]:
+    return json.loads(raw) if raw else {}
+
+
+class SqliteStorage(BaseStorage):
+    """
+    Таблица fsm_state (миграция v4): key -> state, data (JSON), updated_at (unix).
+    Записи старше ttl секунд считаются пустыми и удаляются purge_expired().
+    Соединения — из общего пула config (открывается в main()).
+    """
+
+    def __init__(self, ttl: int | None = FSM_DRAFT_TTL, key_builder: KeyBuilder | None = None) -> None:
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    def _fresh_since(self) -> int:
+        return int(time.time()) - self.ttl if self.ttl else 0
+
+    async def _read(self, key: StorageKey) -> tuple[str | None, str | None]:
+        async with db_read() as db:
+            cur = await db.execute(
+                "SELECT state, data FROM fsm_state WHERE key=? AND updated_at>=?",
+                (self._key(key), self._fresh_since())
+            )
+            row = await cur.fetchone()
+        return (row["state"], row["data"]) if row else (None, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        k = self._key(key)
+        async with db_write() as db:
+            # протухшие данные при перезаписи не «оживляем»
+            await db.execute(
+                "INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at, "
+                "data=CASE WHEN fsm_state.updated_at>=? THEN fsm_state.data END",
+                (k, state, int(time.time()), self._fresh_since())
+            )
+            if state is None:
+                await db.execute("DELETE FROM fsm_state WHERE key=? AND data IS NULL", (k,))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"Data must be a dict, got {type(data).__name__}")
+        k = self._key(key)
+        async with db_write() as db:
+            await db.execute(
+                "INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, NULL, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at, "
+                "state=CASE WHEN fsm_state.updated_at>=? THEN fsm_state.state END",
+                (k, _dumps(data), int(time.time()), self._fresh_since())
+            )
+            if not data:
+                await db.execute("DELETE FROM fsm_state WHERE key=? AND state IS NULL", (k,))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, raw = await self._read(key)
+        return _loads(raw)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        # чтение и запись в одной IMMEDIATE-транзакции: соседний процесс не вклинится между ними
+        k = self._key(key)
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute(
+                "SELECT data FROM fsm_state WHERE key=? AND updated_at>=?", (k, self._fresh_since())
+            )
+            row = await cur.fetchone()
+            current = _loads(row["data"] if row else None)
+            current.update(data)
+            await db.execute(
+                "INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, NULL, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at, "
+                "state=CASE WHEN fsm_state.updated_at>=? THEN fsm_state.state END",
+                (k, _dumps(current), int(time.time()), self._fresh_since())
+            )
+        return current.copy()
+
+    async def purge_expired(self, limit: int = 1000) -> int:
+        """Удаляет до limit протухших черновиков; возвращает, сколько удалено."""
+        if not self.ttl:
+            return 0
+        async with db_write() as db:
+            cur = await db.execute(
+                "DELETE FROM fsm_state WHERE rowid IN "
+                "(SELECT rowid FROM fsm_state WHERE updated_at<? LIMIT ?)",
+                (self._fresh_since(), limit)
+            )
+            return cur.rowcount
+
+    async def close(self) -> None:
+        # пул принадлежит main(), здесь закрывать нечего
+        pass
@@ -2,13 +2,16 @@
 # Полностью готовый файл под текущий config.py (все константы и БД — в config)
 
 import asyncio
-import aiosqlite
+import hashlib
+import secrets
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher, F, Router
 from aiogram.types import (
-    Message, CallbackQuery, PhotoSize,
+    Message, CallbackQuery, PhotoSize, InlineQuery,
+    InlineQueryResultArticle, InputTextMessageContent,
     InlineKeyboardMarkup, InlineKeyboardButton,
     ReplyKeyboardMarkup, KeyboardButton,
     InputMediaPhoto, FSInputFile
@@ -17,6 +20,16 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from botinfo import BotInfo
+from broadcaster import ALL_KEYWORD, Broadcaster, keyword_tokens
+from cache import TtlLruCache
+from digests import OfferDigest
+from fsm_storage import SqliteStorage
+from metrics import METRICS, setup_metrics
+from ordering import ConcurrencyLimitMiddleware, ReleasingEventIsolation
+from scheduler import build_maintenance_scheduler
+from sender import OutboundQueue, RateLimiter, RateLimitMiddleware, mark_background
+from webhook_server import run_webhook
 from config import (
     # константы/пути/айди
     BOT_TOKEN, START_IMAGE_PATH, START_IMAGE_URL,
@@ -24,9 +37,16 @@ from config import (
     BUTTONS, ACCEPT_BUTTON_TEXT, ACCEPT_CALLBACK_DATA, WELCOME_TEXT,
     REPLY_BUTTONS,
     HELP_SUPPORT_USERNAME, HELP_NEWS_USERNAME, HELP_OFFERS_USERNAME, HELP_ADS_USERNAME,
-    DB_PATH,
-    # инициализация БД и миграции
-    init_db
+    ACCEPTED_CACHE_SIZE, ACCEPTED_CACHE_NEGATIVE_TTL, SUBMIT_DEDUP_CACHE_SIZE, SUBMIT_DEDUP_TTL,
+    PROFILE_FLUSH_INTERVAL_MS, PROFILE_FLUSH_MAX_ITEMS, PROFILE_KNOWN_CACHE_SIZE,
+    PROFILE_VIEW_CACHE_SIZE, PROFILE_VIEW_CACHE_TTL,
+    FSM_STORAGE, KEYBOARD_CACHE_SIZE, RUN_MODE, SUBSCRIPTIONS_PER_USER,
+    SEARCH_PAGE_SIZE, SEARCH_INLINE_PAGE_SIZE, OFFERS_PAGE_SIZE, OFFER_SCORE_EXPR,
+    QUEUE_PAGE_SIZE, QUEUE_BATCH_MAX, QUEUE_PUBLISH_CONCURRENCY,
+    METRICS_ENABLED, METRICS_LOG_INTERVAL, SERIALIZE_UPDATES, UPDATE_CONCURRENCY,
+    # инициализация БД/миграции и пул соединений
+    REQUEST_COLUMNS,
+    init_db, open_db_pool, close_db_pool, db_read, db_write
 )
 
 # ==== Routers ====
@@ -38,113 +58,470 @@ mod_router = Router(name="moderation")
 mod_router.message.filter(F.chat.id == MODERATION_CHAT_ID)
 mod_router.callback_query.filter(F.message.chat.id == MODERATION_CHAT_ID)
 
+# ===========================
+# Кэш флага accepted: ensure_access_or_prompt зовётся почти на каждое сообщение
+# ===========================
+ACCEPTED_CACHE = TtlLruCache(ACCEPTED_CACHE_SIZE)
+
+def accepted_cache_stats() -> dict:
+    return ACCEPTED_CACHE.stats()
+
+# Экран профиля (строка профиля + агрегаты) — до первой записи, меняющей его
+PROFILE_VIEW_CACHE = TtlLruCache(PROFILE_VIEW_CACHE_SIZE, ttl=PROFILE_VIEW_CACHE_TTL)
+
+# ===========================
+# Идемпотентность «Отправить на модерацию» / отклика: ключ = пользователь + токен черновика
+# (кладётся в FSM при старте мастера), для старых черновиков без токена — id callback'а/сообщения.
+# Сначала дешёвая проверка в памяти (до любой записи и отправки), в БД — UNIQUE(idem_key) (v12)
+# ===========================
+SUBMITTED = TtlLruCache(SUBMIT_DEDUP_CACHE_SIZE, ttl=SUBMIT_DEDUP_TTL)
+
+def new_draft_key() -> str:
+    return secrets.token_urlsafe(9)
+
+def submission_key(kind: str, user_id: int, draft_key: str | None, event) -> str:
+    if not draft_key:
+        if isinstance(event, CallbackQuery):
+            draft_key = f"cb{event.id}"
+        else:
+            draft_key = f"m{event.chat.id}.{event.message_id}"
+    return f"{kind}:{user_id}:{draft_key}"
+
+def claim_submission(key: str) -> bool:
+    """False — этот ключ уже отправлен или отправляется прямо сейчас."""
+    if key in SUBMITTED:
+        return False
+    SUBMITTED.set(key, True)
+    return True
+
+# ===========================
+# Write-behind для ensure_profile: INSERT/COALESCE first_seen пачками, одна транзакция
+# ===========================
+class ProfileWriteBehind:
+    SQL = (
+        "INSERT INTO user_profile (user_id, first_seen) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET first_seen = COALESCE(first_seen, excluded.first_seen)"
+    )
+
+    def __init__(self, interval_ms: int, max_items: int, known_size: int) -> None:
+        self.interval = interval_ms / 1000
+        self.max_items = max(1, max_items)
+        self.known = TtlLruCache(known_size)   # user_id, чей профиль точно есть в БД
+        self._pending: dict[int, str] = {}     # user_id -> first_seen (первое значение побеждает)
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    def add(self, user_id: int, first_seen: str) -> None:
+        self._pending.setdefault(user_id, first_seen)
+        if len(self._pending) >= self.max_items:
+            self._wakeup.set()
+
+    def is_pending(self, user_id: int) -> bool:
+        return user_id in self._pending
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                async with db_write() as db:
+                    await db.executemany(self.SQL, list(batch.items()))
+            except Exception:
+                # вернём в очередь — попробуем на следующем тике
+                for uid, ts in batch.items():
+                    self._pending.setdefault(uid, ts)
+                raise
+            for uid in batch:
+                self.known.set(uid, True)
+                PROFILE_VIEW_CACHE.pop(uid)
+            self.flushes += 1
+            self.rows_written += len(batch)
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[profile-wb] flush failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()   # ничего не теряем при остановке
+
+PROFILE_WRITER = ProfileWriteBehind(PROFILE_FLUSH_INTERVAL_MS, PROFILE_FLUSH_MAX_ITEMS, PROFILE_KNOWN_CACHE_SIZE)
+
 # ===========================
 # DB-утилиты поверх схемы из config.init_db
+# (соединения берутся из общего пула: db_read() — чтение, db_write() — запись + commit)
 # ===========================
 async def ensure_profile(user_id: int) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("INSERT OR IGNORE INTO user_profile (user_id) VALUES (?)", (user_id,))
-        await db.execute(
-            "UPDATE user_profile SET first_seen = COALESCE(first_seen, ?) WHERE user_id = ?",
-            (datetime.utcnow().isoformat(), user_id)
-        )
-        await db.commit()
+    # сама запись — в PROFILE_WRITER (пачками); уже известные профили не пишем вовсе
+    if PROFILE_WRITER.known.get(user_id):
+        return
+    PROFILE_WRITER.add(user_id, datetime.utcnow().isoformat())
+
+async def _profile_barrier(user_id: int) -> None:
+    """Перед чтением/UPDATE профиля: если его first_seen ещё в очереди — дописываем сразу."""
+    if PROFILE_WRITER.is_pending(user_id):
+        await PROFILE_WRITER.flush()
 
 async def set_accepted(user_id: int) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE user_profile SET accepted=1 WHERE user_id=?", (user_id,))
-        await db.commit()
+    # upsert: «Принять» могут нажать и без /start (кнопка есть в ensure_access_or_prompt)
+    async with db_write() as db:
+        await db.execute(
+            "INSERT INTO user_profile (user_id, accepted) VALUES (?, 1) "
+            "ON CONFLICT(user_id) DO UPDATE SET accepted=1",
+            (user_id,)
+        )
+    ACCEPTED_CACHE.set(user_id, True)
+    PROFILE_VIEW_CACHE.pop(user_id)
 
 async def is_user_accepted(user_id: int) -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    cached = ACCEPTED_CACHE.get(user_id)
+    if cached is not None:
+        return cached
+    async with db_read() as db:
         cur = await db.execute("SELECT accepted FROM user_profile WHERE user_id=?", (user_id,))
         row = await cur.fetchone()
-        return bool(row and row["accepted"])
+    accepted = bool(row and row["accepted"])
+    ACCEPTED_CACHE.set(user_id, accepted, ttl=None if accepted else ACCEPTED_CACHE_NEGATIVE_TTL)
+    return accepted
 
 async def get_profile(user_id: int) -> dict | None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    await _profile_barrier(user_id)
+    async with db_read() as db:
         cur = await db.execute("SELECT * FROM user_profile WHERE user_id = ?", (user_id,))
         row = await cur.fetchone()
         return dict(row) if row else None
 
 async def insert_request(user_id: int, private_title: str, item_title: str,
-                         description: str, photo_file_id: str | None) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+                         description: str, photo_file_id: str | None,
+                         idem_key: str | None = None) -> tuple[int, bool]:
+    """(id, создана ли сейчас): при повторе с тем же idem_key возвращается уже существующая."""
+    async with db_write() as db:
         cur = await db.execute(
             """
-            INSERT INTO requests (user_id, private_title, item_title, description, photo_file_id, status, created_at)
-            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+            INSERT INTO requests (user_id, private_title, item_title, description, photo_file_id, status, created_at, idem_key)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)
+            ON CONFLICT(idem_key) DO NOTHING
             """,
-            (user_id, private_title, item_title, description, photo_file_id, datetime.utcnow().isoformat())
+            (user_id, private_title, item_title, description, photo_file_id, datetime.utcnow().isoformat(), idem_key)
         )
-        await db.commit()
-        return cur.lastrowid
+        if not cur.rowcount:
+            cur = await db.execute("SELECT id FROM requests WHERE idem_key = ?", (idem_key,))
+            return (await cur.fetchone())["id"], False
+    PROFILE_VIEW_CACHE.pop(user_id)
+    return cur.lastrowid, True
+
+# ===== слайдер «Активные запросы»: keyset-пагинация по idx_requests_user_id =====
+async def get_user_request_page(user_id: int, before_id: int | None = None,
+                                after_id: int | None = None) -> dict | None:
+    """
+    Одна карточка слайдера (новые — первыми): без курсора — самая новая заявка,
+    before_id — следующая более старая, after_id — предыдущая более новая.
+    """
+    if after_id is not None:
+        sql, args = "SELECT * FROM requests WHERE user_id=? AND id>? ORDER BY id ASC LIMIT 1", (user_id, after_id)
+    elif before_id is not None:
+        sql, args = "SELECT * FROM requests WHERE user_id=? AND id<? ORDER BY id DESC LIMIT 1", (user_id, before_id)
+    else:
+        sql, args = "SELECT * FROM requests WHERE user_id=? ORDER BY id DESC LIMIT 1", (user_id,)
+    async with db_read() as db:
+        cur = await db.execute(sql, args)
+        row = await cur.fetchone()
+        return dict(row) if row else None
 
-async def list_user_requests_ordered(user_id: int) -> list[dict]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def get_user_request_at(user_id: int, idx: int) -> dict | None:
+    # только для старых кнопок «rl:go:<idx>» без курсора
+    async with db_read() as db:
         cur = await db.execute(
-            "SELECT * FROM requests WHERE user_id=? ORDER BY id DESC",
-            (user_id,)
+            "SELECT * FROM requests WHERE user_id=? ORDER BY id DESC LIMIT 1 OFFSET ?", (user_id, idx)
         )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+async def user_request_position(user_id: int, req_id: int) -> tuple[int, int]:
+    """(индекс заявки в слайдере, всего заявок) — одним проходом по индексу автора."""
+    async with db_read() as db:
+        cur = await db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(id > ?), 0) FROM requests WHERE user_id=?", (req_id, user_id)
+        )
+        total, idx = await cur.fetchone()
+        return int(idx), int(total)
 
 async def count_user_requests(user_id: int) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_read() as db:
         cur = await db.execute("SELECT COUNT(*) FROM requests WHERE user_id=?", (user_id,))
         (n,) = await cur.fetchone()
         return int(n or 0)
 
+# горячая таблица, иначе архив (read-through): ветки UNION ALL идут по порядку, и LIMIT 1
+# не трогает архив, если заявка нашлась в bot.db
+GET_REQUEST_SQL = f"""
+    SELECT {REQUEST_COLUMNS}, 0 AS archived FROM main.requests WHERE id = ?
+    UNION ALL
+    SELECT {REQUEST_COLUMNS}, 1 AS archived FROM archive.requests_archive WHERE id = ?
+    LIMIT 1
+"""
+
 async def get_request(req_id: int) -> dict | None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT * FROM requests WHERE id=?", (req_id,))
+    async with db_read() as db:
+        cur = await db.execute(GET_REQUEST_SQL, (req_id, req_id))
         row = await cur.fetchone()
         return dict(row) if row else None
 
 async def update_request_field(req_id: int, field: str, value: str | None) -> None:
     assert field in ("private_title", "item_title", "description", "photo_file_id")
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_write() as db:
         await db.execute(f"UPDATE requests SET {field}=? WHERE id=?", (value, req_id))
-        await db.commit()
 
-async def update_request_status(req_id: int, status: str, reason: str | None = None) -> None:
+# ===== очередь модерации: pending по idx_requests_status (status, rowid), keyset по id =====
+async def get_pending_page(after_id: int = 0, limit: int = QUEUE_PAGE_SIZE) -> tuple[list[dict], bool]:
+    """Старые сначала; второй элемент — есть ли ещё страница."""
+    async with db_read() as db:
+        cur = await db.execute(
+            "SELECT id, user_id, item_title, photo_file_id FROM requests"
+            " WHERE status = 'pending' AND id > ? ORDER BY id LIMIT ?",
+            (after_id, limit + 1)
+        )
+        rows = [dict(r) for r in await cur.fetchall()]
+    return rows[:limit], len(rows) > limit
+
+async def count_pending() -> int:
+    async with db_read() as db:
+        cur = await db.execute("SELECT COUNT(*) FROM requests WHERE status = 'pending'")
+        return (await cur.fetchone())[0]
+
+async def moderate_batch(req_ids: list[int], status: str, reason: str | None = None) -> list[dict]:
+    """
+    Одна транзакция на всю пачку. Переводятся только ещё pending заявки (вторая вкладка/другой
+    модератор успел раньше — такие не трогаем); возвращаются строки тех, что перевели сейчас.
+    """
     assert status in ("approved", "rejected")
-    async with aiosqlite.connect(DB_PATH) as db:
-        if status == "approved":
-            await db.execute(
-                "UPDATE requests SET status='approved', moderated_at=? WHERE id=?",
-                (datetime.utcnow().isoformat(), req_id)
-            )
-        else:
-            await db.execute(
-                "UPDATE requests SET status='rejected', reject_reason=?, moderated_at=? WHERE id=?",
-                (reason or "", datetime.utcnow().isoformat(), req_id)
-            )
-        await db.commit()
+    if not req_ids:
+        return []
+    marks = ",".join("?" * len(req_ids))
+    async with db_write() as db:
+        cur = await db.execute(
+            f"UPDATE requests SET status = ?, reject_reason = ?, moderated_at = ?"
+            f" WHERE status = 'pending' AND id IN ({marks})"
+            f" RETURNING {REQUEST_COLUMNS}",
+            (status, (reason or "") if status == "rejected" else None, datetime.utcnow().isoformat(), *req_ids)
+        )
+        rows = [dict(r) for r in await cur.fetchall()]
+    return sorted(rows, key=lambda r: r["id"])
+
+async def mark_published(req_id: int) -> None:
+    async with db_write() as db:
+        await db.execute("UPDATE requests SET published_at=? WHERE id=?", (datetime.utcnow().isoformat(), req_id))
+
+async def list_unpublished() -> list[dict]:
+    """Одобренные, но не дошедшие до канала (рестарт посреди публикации) — по idx_requests_unpublished."""
+    async with db_read() as db:
+        cur = await db.execute(
+            f"SELECT {REQUEST_COLUMNS} FROM requests WHERE status = 'approved' AND published_at IS NULL ORDER BY id"
+        )
+        return [dict(r) for r in await cur.fetchall()]
+
+# ===== экран профиля: профиль + все агрегаты одним запросом =====
+# Отдельного статуса «сделка» пока нет: успешным считаем отклик продавца на опубликованную
+# (approved, а после срока — closed) заявку, суммой сделок — сумму цен таких откликов.
+# Заявки, перенесённые в архив (scheduler.archive_closed_requests), тоже считаются.
+PROFILE_VIEW_SQL = """
+    SELECT p.*,
+           (SELECT COUNT(*) FROM requests r WHERE r.user_id = p.user_id)
+         + (SELECT COUNT(*) FROM archive.requests_archive r WHERE r.user_id = p.user_id) AS total_requests,
+           a.successful_offers,
+           a.total_deals_sum
+      FROM user_profile p,
+           (SELECT COUNT(*)               AS successful_offers,
+                   COALESCE(SUM(price), 0) AS total_deals_sum
+              FROM (SELECT o.price FROM offers o
+                      JOIN requests r ON r.id = o.request_id
+                     WHERE o.seller_id = ? AND r.status IN ('approved', 'closed')
+                    UNION ALL
+                    SELECT o.price FROM archive.offers_archive o
+                      JOIN archive.requests_archive r ON r.id = o.request_id
+                     WHERE o.seller_id = ? AND r.status = 'closed')) a
+     WHERE p.user_id = ?
+"""
+
+async def get_profile_view(user_id: int) -> dict | None:
+    await _profile_barrier(user_id)
+    view = PROFILE_VIEW_CACHE.get(user_id)
+    if view is not None:
+        return view
+    async with db_read() as db:
+        cur = await db.execute(PROFILE_VIEW_SQL, (user_id, user_id, user_id))
+        row = await cur.fetchone()
+    if not row:
+        return None
+    view = dict(row)
+    PROFILE_VIEW_CACHE.set(user_id, view)
+    return view
 
 # ===== offers =====
 async def insert_offer(request_id: int, seller_id: int, price: float,
-                       days: int, cond: int, photo_file_id: str | None) -> int:
-    async with aiosqlite.connect(DB_PATH) as db:
+                       days: int, cond: int, photo_file_id: str | None,
+                       idem_key: str | None = None) -> tuple[int, bool]:
+    """(id, создан ли сейчас) — как insert_request."""
+    async with db_write() as db:
         cur = await db.execute(
             """
-            INSERT INTO offers (request_id, seller_id, price, days, cond, photo_file_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO offers (request_id, seller_id, price, days, cond, photo_file_id, created_at, idem_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(idem_key) DO NOTHING
             """,
-            (request_id, seller_id, price, days, cond, photo_file_id, datetime.utcnow().isoformat())
+            (request_id, seller_id, price, days, cond, photo_file_id, datetime.utcnow().isoformat(), idem_key)
+        )
+        if not cur.rowcount:
+            cur = await db.execute("SELECT id FROM offers WHERE idem_key = ?", (idem_key,))
+            return (await cur.fetchone())["id"], False
+    PROFILE_VIEW_CACHE.pop(seller_id)
+    return cur.lastrowid, True
+
+# ===== экран «Отклики»: сортировка по индексам v8, страница — keyset по (ключ, id) =====
+# ключи совпадают с выражениями индексов idx_offers_req_* (миграция v8)
+OFFER_SORT_KEYS = {
+    "b": OFFER_SCORE_EXPR,   # лучшие: цена с поправкой на срок и состояние
+    "p": "price",
+    "d": "days",
+    "c": "-cond",
+}
+OFFER_SORT_TITLES = {"b": "лучшие", "p": "дешевле", "d": "быстрее", "c": "состояние"}
+
+async def get_offer_page(request_id: int, sort: str = "b", after: tuple[float, int] | None = None,
+                         limit: int = OFFERS_PAGE_SIZE) -> tuple[list[dict], tuple[float, int] | None]:
+    """Страница откликов в порядке sort после курсора (ключ, id); второй элемент — курсор следующей."""
+    key = OFFER_SORT_KEYS[sort]
+    # «k >= ? AND (k > ? OR id > ?)», а не row value: так SQLite берёт диапазон и по индексу-выражению
+    where = f"AND {key} >= ? AND ({key} > ? OR id > ?)" if after else ""
+    params = (request_id, after[0], after[0], after[1], limit + 1) if after else (request_id, limit + 1)
+    async with db_read() as db:
+        cur = await db.execute(
+            f"SELECT id, seller_id, price, days, cond, photo_file_id, {key} AS sort_key "
+            f"FROM offers WHERE request_id=? {where} ORDER BY {key}, id LIMIT ?",
+            params
+        )
+        rows = [dict(r) for r in await cur.fetchall()]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]["sort_key"], rows[-1]["id"])
+
+# ===== поиск: FTS5-индекс requests_fts (миграция v7) =====
+# Ранжирование в SQL по уровням: 0 — все слова есть в названии, 1 — остальные совпадения;
+# внутри уровня — свежие сначала. bm25 не используем: для IDF он проходит весь doclist
+# каждого слова, и частое слово на миллионе заявок стоит десятки мс. По rowid FTS5 отдаёт
+# doclist потоково, поэтому страница — это LIMIT строк после курсора (уровень, id), а не OFFSET.
+def fts_query(text: str) -> str | None:
+    """Пользовательский ввод -> безопасный MATCH: каждое слово как префикс, все слова обязательны."""
+    words = keyword_tokens(text)[:8]
+    return " ".join(f'"{w}"*' for w in words) if words else None
+
+def _search_tiers(q: str) -> tuple[str, str]:
+    return f"{{item_title}} : ({q})", f"({q}) NOT {{item_title}} : ({q})"
+
+SEARCH_SQL = """
+    SELECT r.id, r.item_title, r.description, r.photo_file_id, r.status,
+           snippet(requests_fts, 1, '', '', '…', 12) AS snip
+      FROM requests_fts
+      JOIN requests r ON r.id = requests_fts.rowid
+     WHERE requests_fts MATCH ? AND requests_fts.rowid < ? AND (? OR r.status = 'approved')
+     ORDER BY requests_fts.rowid DESC
+     LIMIT ?
+"""
+
+def _parse_search_cursor(cursor: str | None) -> tuple[int, int]:
+    try:
+        tier, last_id = cursor.split(":")
+        return min(1, max(0, int(tier))), int(last_id)
+    except (AttributeError, ValueError):
+        return 0, 2 ** 63 - 1
+
+async def search_requests(text: str, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE,
+                          include_all: bool = False) -> tuple[list[dict], str | None]:
+    """Страница результатов (по умолчанию только одобренные) и курсор следующей ('уровень:id') или None."""
+    q = fts_query(text)
+    if not q:
+        return [], None
+    tier, last_id = _parse_search_cursor(cursor)
+    rows: list[dict] = []
+    async with db_read() as db:
+        for t, match in enumerate(_search_tiers(q)):
+            if t < tier:
+                continue
+            cur = await db.execute(SEARCH_SQL, (match, last_id if t == tier else 2 ** 63 - 1,
+                                                int(include_all), limit + 1 - len(rows)))
+            rows += [dict(r, tier=t) for r in await cur.fetchall()]
+            if len(rows) > limit:
+                break
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, f"{rows[-1]['tier']}:{rows[-1]['id']}"
+
+# ===== подписки продавцов =====
+async def add_subscriptions(user_id: int, keywords: list[str]) -> tuple[list[str], int]:
+    """Добавляет слова (в пределах SUBSCRIPTIONS_PER_USER); возвращает (добавленные, всего)."""
+    async with db_write() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        cur = await db.execute("SELECT keyword FROM seller_subscriptions WHERE user_id=?", (user_id,))
+        have = {r["keyword"] for r in await cur.fetchall()}
+        fresh = [k for k in dict.fromkeys(keywords) if k not in have]
+        fresh = fresh[:max(0, SUBSCRIPTIONS_PER_USER - len(have))]
+        now = datetime.utcnow().isoformat()
+        await db.executemany(
+            "INSERT OR IGNORE INTO seller_subscriptions (keyword, user_id, created_at) VALUES (?, ?, ?)",
+            [(k, user_id, now) for k in fresh]
+        )
+    return fresh, len(have) + len(fresh)
+
+async def remove_subscriptions(user_id: int, keywords: list[str] | None = None) -> int:
+    async with db_write() as db:
+        if keywords is None:
+            cur = await db.execute("DELETE FROM seller_subscriptions WHERE user_id=?", (user_id,))
+        else:
+            marks = ",".join("?" * len(keywords))
+            cur = await db.execute(
+                f"DELETE FROM seller_subscriptions WHERE user_id=? AND keyword IN ({marks})",
+                (user_id, *keywords)
+            )
+        return cur.rowcount
+
+async def list_subscriptions(user_id: int) -> list[str]:
+    async with db_read() as db:
+        cur = await db.execute(
+            "SELECT keyword FROM seller_subscriptions WHERE user_id=? ORDER BY keyword", (user_id,)
         )
-        await db.commit()
-        return cur.lastrowid
+        return [r["keyword"] for r in await cur.fetchall()]
 
 # ===========================
 # Профиль: сохранение CDEK/реквизитов
 # ===========================
 async def save_cdek(user_id: int, fio: str, phone: str, address: str) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
+    await _profile_barrier(user_id)
+    async with db_write() as db:
         await db.execute(
             """
             UPDATE user_profile
@@ -153,10 +530,11 @@ async def save_cdek(user_id: int, fio: str, phone: str, address: str) -> None:
             """,
             (fio, phone, address, user_id)
         )
-        await db.commit()
+    PROFILE_VIEW_CACHE.pop(user_id)
 
 async def save_reqs(user_id: int, fio: str, card: str, bank: str) -> None:
-    async with aiosqlite.connect(DB_PATH) as db:
+    await _profile_barrier(user_id)
+    async with db_write() as db:
         await db.execute(
             """
             UPDATE user_profile
@@ -165,7 +543,7 @@ async def save_reqs(user_id: int, fio: str, card: str, bank: str) -> None:
             """,
             (fio, card, bank, user_id)
         )
-        await db.commit()
+    PROFILE_VIEW_CACHE.pop(user_id)
 
 # ===========================
 # Утилиты
@@ -178,7 +556,31 @@ def largest_photo(photos: list[PhotoSize]) -> PhotoSize | None:
 
 # ===========================
 # Клавиатуры
+# Разметка зависит только от констант config (или от пары id), поэтому строим её один раз:
+# статичные — @static_keyboard (собираются в warm_keyboards() при старте),
+# параметризованные — @param_keyboard (ограниченный LRU). Объекты общие — не мутировать.
 # ===========================
+STATIC_KEYBOARDS: list = []
+PARAM_KEYBOARDS: list = []
+
+def static_keyboard(fn):
+    cached = lru_cache(maxsize=1)(fn)
+    STATIC_KEYBOARDS.append(cached)
+    return cached
+
+def param_keyboard(fn):
+    cached = lru_cache(maxsize=KEYBOARD_CACHE_SIZE)(fn)
+    PARAM_KEYBOARDS.append(cached)
+    return cached
+
+def warm_keyboards() -> None:
+    for build in STATIC_KEYBOARDS:
+        build()
+
+def keyboard_cache_stats() -> dict:
+    return {fn.__name__: fn.cache_info()._asdict() for fn in STATIC_KEYBOARDS + PARAM_KEYBOARDS}
+
+@static_keyboard
 def start_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(text=BUTTONS[0]["text"], url=BUTTONS[0]["url"]),
@@ -187,6 +589,7 @@ def start_keyboard() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text=ACCEPT_BUTTON_TEXT, callback_data=ACCEPT_CALLBACK_DATA)
     ]])
 
+@static_keyboard
 def menu_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[[KeyboardButton(text=REPLY_BUTTONS[0]),
@@ -195,6 +598,7 @@ def menu_keyboard() -> ReplyKeyboardMarkup:
         resize_keyboard=True
     )
 
+@static_keyboard
 def requests_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -205,6 +609,7 @@ def requests_keyboard() -> ReplyKeyboardMarkup:
         resize_keyboard=True
     )
 
+@static_keyboard
 def help_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔘 Тех. Поддержка",        url=f"https://t.me/{HELP_SUPPORT_USERNAME}")],
@@ -218,32 +623,55 @@ CB_PROFILE_CDEK = "profile:cdek"
 CB_PROFILE_REQS = "profile:reqs"
 CB_PROFILE_BACK = "profile:back"
 
+@static_keyboard
 def profile_missing_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Контактные данные (CDEK)", callback_data=CB_PROFILE_CDEK)],
         [InlineKeyboardButton(text="Реквизиты",                 callback_data=CB_PROFILE_REQS)],
     ])
 
+@static_keyboard
 def back_inline_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="↩️ Вернуться", callback_data=CB_PROFILE_BACK)]
     ])
 
 # Слайдер активных заявок
+# Позиция едет в callback_data: rl:p|rl:n:<новый idx>:<total>:<id текущей карточки>
+# (p — к более новой, id > текущего; n — к более старой, id < текущего), поэтому
+# серверу не нужно помнить список id пользователя.
+@param_keyboard
 def slider_kb(idx: int, total: int, req_id: int) -> InlineKeyboardMarkup:
     rows = []
     if total > 1:
         nav_row = []
         if idx > 0:
-            nav_row.append(InlineKeyboardButton(text="◀︎", callback_data=f"rl:go:{idx-1}"))
+            nav_row.append(InlineKeyboardButton(text="◀︎", callback_data=f"rl:p:{idx-1}:{total}:{req_id}"))
         if idx < total - 1:
-            nav_row.append(InlineKeyboardButton(text="▶︎", callback_data=f"rl:go:{idx+1}"))
+            nav_row.append(InlineKeyboardButton(text="▶︎", callback_data=f"rl:n:{idx+1}:{total}:{req_id}"))
         if nav_row:
             rows.append(nav_row)
-    rows.append([InlineKeyboardButton(text="🔘 Изменить запрос", callback_data=f"rl:edit:{req_id}")])
+    rows.append([InlineKeyboardButton(text="💬 Отклики", callback_data=f"of:{req_id}:b")])
+    rows.append([InlineKeyboardButton(text="🔘 Изменить запрос", callback_data=f"rl:edit:{req_id}:{idx}:{total}")])
     rows.append([InlineKeyboardButton(text="🔘 Вернуться", callback_data="rl:back")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+def offers_kb(req_id: int, sort: str, first_page: bool, next_after: tuple[float, int] | None) -> InlineKeyboardMarkup:
+    rows = [[
+        InlineKeyboardButton(text=("• " if s == sort else "") + title, callback_data=f"of:{req_id}:{s}")
+        for s, title in OFFER_SORT_TITLES.items()
+    ]]
+    nav = []
+    if not first_page:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data=f"of:{req_id}:{sort}"))
+    if next_after:
+        nav.append(InlineKeyboardButton(text="Ещё ▶️", callback_data=f"of:{req_id}:{sort}:{next_after[0]!r}:{next_after[1]}"))
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="« К заявке", callback_data=f"of:back:{req_id}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@static_keyboard
 def change_existing_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔘 Личное название", callback_data="re:ep")],
@@ -258,11 +686,13 @@ CB_REQ_SKIP_PHOTO = "req:skip_photo"
 CB_REQ_CONFIRM    = "req:confirm"
 CB_REQ_CHANGE     = "req:change"
 
+@static_keyboard
 def photo_or_skip_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔘 Пропустить", callback_data=CB_REQ_SKIP_PHOTO)]
     ])
 
+@static_keyboard
 def confirm_or_change_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔘 Подтвердить", callback_data=CB_REQ_CONFIRM),
@@ -270,6 +700,7 @@ def confirm_or_change_kb() -> InlineKeyboardMarkup:
     ])
 
 # Админ-модерация
+@param_keyboard
 def admin_moderation_kb(req_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Одобрить",  callback_data=f"adm:ok:{req_id}"),
@@ -284,6 +715,7 @@ def build_public_post_text(row: dict) -> str:
         f"• Описание: {row.get('description') or '—'}"
     )
 
+@param_keyboard
 def public_offer_kb(bot_username: str, req_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(
@@ -293,6 +725,7 @@ def public_offer_kb(bot_username: str, req_id: int) -> InlineKeyboardMarkup:
     ]])
 
 # Отклик: клавиатуры
+@static_keyboard
 def offer_condition_kb() -> InlineKeyboardMarkup:
     rows = []
     row1 = [InlineKeyboardButton(text=str(i), callback_data=f"offer:cond:{i}") for i in range(1, 6)]
@@ -303,6 +736,12 @@ def offer_condition_kb() -> InlineKeyboardMarkup:
 
 CB_OFFER_SKIP_PHOTO = "offer:skip_photo"
 
+@static_keyboard
+def offer_photo_or_skip_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔘 Пропустить", callback_data=CB_OFFER_SKIP_PHOTO)]
+    ])
+
 # ===========================
 # Тексты профиля и форматирование
 # ===========================
@@ -341,9 +780,8 @@ def has_cdek(profile: dict | None) -> bool:
 def has_reqs(profile: dict | None) -> bool:
     return bool(profile and (profile.get("payout_fio") or profile.get("payout_card") or profile.get("payout_bank")))
 
-async def build_profile_stats_text(user_id: int) -> str:
-    profile = await get_profile(user_id)
-    first_seen = profile.get("first_seen") if profile else None
+def build_profile_stats_text(user_id: int, view: dict | None) -> str:
+    first_seen = view.get("first_seen") if view else None
     dt = None
     if first_seen:
         try:
@@ -351,19 +789,33 @@ async def build_profile_stats_text(user_id: int) -> str:
         except Exception:
             dt = None
     date_str = dt.strftime("%Y-%m-%d %H:%M:%S UTC") if dt else "—"
-    total_requests = await count_user_requests(user_id)
-    successful_offers = 0
-    total_deals_sum = 0.0
+    total_requests = int(view["total_requests"]) if view else 0
+    successful_offers = int(view["successful_offers"]) if view else 0
+    total_deals_sum = float(view["total_deals_sum"]) if view else 0.0
     return (
         f"Профиль ({user_id})\n"
         f"• Дата регистрации в боте «первый вход»: {date_str}\n"
         f"• Количество размещенных заявок: {total_requests}\n"
         f"• Количество успешных откликов на заказы пользователей: {successful_offers}\n"
         f"• Сумма всех сделок: {total_deals_sum}\n"
-        f"• Внесены контактные данные: {'Да' if has_cdek(profile) else 'Нет'}\n"
-        f"• Внесены реквизиты: {'Да' if has_reqs(profile) else 'Нет'}"
+        f"• Внесены контактные данные: {'Да' if has_cdek(view) else 'Нет'}\n"
+        f"• Внесены реквизиты: {'Да' if has_reqs(view) else 'Нет'}"
     )
 
+async def send_profile_screen(message: Message, user_id: int) -> None:
+    view = await get_profile_view(user_id)
+    await message.answer(build_profile_stats_text(user_id, view))
+    if not has_cdek(view) or not has_reqs(view):
+        await message.answer(
+            "Для заказов желательно заполнить контактные данные и реквизиты.",
+            reply_markup=profile_missing_keyboard()
+        )
+    else:
+        await message.answer(
+            f"{fmt_cdek(view)}\n\n{fmt_reqs(view)}",
+            reply_markup=profile_missing_keyboard()
+        )
+
 # ===========================
 # FSM
 # ===========================
@@ -373,6 +825,7 @@ class ProfileFill(StatesGroup):
 
 class AdminReject(StatesGroup):
     waiting_reason = State()
+    waiting_batch_reason = State()   # /queue: одна причина на все отмеченные
 
 class OfferCreate(StatesGroup):
     wait_price     = State()
@@ -386,11 +839,6 @@ class RequestCreate(StatesGroup):
     wait_description   = State()
     wait_photo         = State()
 
-# ===========================
-# Контекст для слайдера
-# ===========================
-REQ_PAGES: dict[int, list[int]] = {}
-
 # ===========================
 # Служебные рендеры
 # ===========================
@@ -478,10 +926,40 @@ async def ensure_access_or_prompt(message: Message) -> bool:
     )
     return False
 
+# ===========================
+# Сведения о боте/чатах: заполняется в main(), хендлерам — через dp["bot_info"]
+# ===========================
+BOT_INFO = BotInfo()
+
+# ===========================
+# Рассылка одобренных заявок подписчикам
+# ===========================
+def render_broadcast(row: dict, bot_username: str) -> tuple:
+    text = "🔔 Новая заявка по вашей подписке\n\n" + build_public_post_text(row)
+    return text, public_offer_kb(bot_username, row["id"]), row.get("photo_file_id")
+
+BROADCASTER = Broadcaster(render_broadcast, bot_info=BOT_INFO)
+
+# ===========================
+# Отклики -> автору: первый сразу, остальные дайджестом (окно OFFER_DIGEST_WINDOW)
+# ===========================
+def deliver_offer_digest(bot: Bot, d: dict) -> None:
+    ids = d["request_ids"]
+    where = f"заявку №{ids[0]}" if len(ids) == 1 else "заявки " + ", ".join(f"№{i}" for i in ids)
+    text = (
+        f"📬 Новые отклики ({d['pending']}) на {where}.\n"
+        f"Лучшая цена: {d['best_price']:g} (заявка №{d['best_request_id']}).\n"
+        "Все отклики — «Мои запросы» → «Активные запросы» → «💬 Отклики»."
+    )
+    author_id = d["author_id"]
+    OUTBOX.submit(lambda: bot.send_message(author_id, text), label=f"offer digest -> {author_id}")
+
+OFFER_DIGEST = OfferDigest(deliver_offer_digest)
+
 # ===========================
 # Уведомление в модерацию
 # ===========================
-async def notify_admin_group(bot: Bot, row: dict, author_id: int) -> None:
+def notify_admin_group(bot: Bot, row: dict, author_id: int) -> None:
     text = (
         "🆕 Новая заявка на модерацию\n"
         f"№{row['id']} (от user_id={author_id})\n\n"
@@ -492,10 +970,85 @@ async def notify_admin_group(bot: Bot, row: dict, author_id: int) -> None:
         f"• Статус: {row.get('status')}\n"
     )
     kb = admin_moderation_kb(row["id"])
-    if row.get("photo_file_id"):
-        await bot.send_photo(MODERATION_CHAT_ID, row["photo_file_id"], caption=text, reply_markup=kb)
+    photo_id = row.get("photo_file_id")
+    if photo_id:
+        OUTBOX.submit(lambda: bot.send_photo(MODERATION_CHAT_ID, photo_id, caption=text, reply_markup=kb),
+                      label=f"moderation card #{row['id']}")
     else:
-        await bot.send_message(MODERATION_CHAT_ID, text, reply_markup=kb)
+        OUTBOX.submit(lambda: bot.send_message(MODERATION_CHAT_ID, text, reply_markup=kb),
+                      label=f"moderation card #{row['id']}")
+
+# ===========================
+# Медиа-кэш: файл грузим в Telegram один раз, дальше шлём по file_id
+# ===========================
+class CachedPhoto:
+    """
+    Картинка из локального файла (ключ — путь + sha256 содержимого) или по URL.
+    Файловая система трогается только в prepare() при старте; file_id хранится в media_cache,
+    так что после рестарта повторной загрузки тоже нет. Файл поменялся — другой sha256,
+    другой ключ, одна новая загрузка.
+    """
+
+    def __init__(self, path: str, url: str = "") -> None:
+        self.raw_path = path
+        self.url = url
+        self.source: str | None = None     # что отправлять, если file_id ещё нет
+        self.digest = ""
+        self.upload: FSInputFile | str | None = None
+        self.file_id: str | None = None
+        self._upload_lock = asyncio.Lock()
+
+    async def prepare(self) -> None:
+        p = Path(self.raw_path).expanduser().resolve() if self.raw_path else None
+        if p and p.is_file():
+            self.source = str(p)
+            self.digest = hashlib.sha256(p.read_bytes()).hexdigest()
+            self.upload = FSInputFile(p)
+        elif self.url:
+            self.source, self.digest, self.upload = self.url, "", self.url
+        else:
+            print(f"[info] Стартовое изображение не задано: {p} и START_IMAGE_URL пуст. Будет использован текст без фото.")
+            return
+        async with db_read() as db:
+            cur = await db.execute(
+                "SELECT file_id FROM media_cache WHERE source=? AND digest=?", (self.source, self.digest)
+            )
+            row = await cur.fetchone()
+        self.file_id = row["file_id"] if row else None
+        print(f"[start-image] {self.source}: {'file_id из кэша' if self.file_id else 'будет загружено при первом /start'}")
+
+    @property
+    def available(self) -> bool:
+        return self.upload is not None
+
+    async def _remember(self, sent: Message) -> None:
+        ph = largest_photo(sent.photo or [])
+        if not ph:
+            return
+        self.file_id = ph.file_id
+        async with db_write() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO media_cache (source, digest, file_id, created_at) VALUES (?, ?, ?, ?)",
+                (self.source, self.digest, self.file_id, datetime.utcnow().isoformat())
+            )
+
+    async def answer(self, message: Message, **kwargs) -> Message:
+        if self.file_id:
+            try:
+                return await message.answer_photo(self.file_id, **kwargs)
+            except Exception as e:
+                # file_id мог протухнуть (другой бот/токен) — загрузим заново
+                print(f"[start-image] cached file_id rejected: {e}")
+                self.file_id = None
+        # первую загрузку делаем одну на всех, остальные дождутся file_id
+        async with self._upload_lock:
+            if self.file_id:
+                return await message.answer_photo(self.file_id, **kwargs)
+            sent = await message.answer_photo(self.upload, **kwargs)
+            await self._remember(sent)
+            return sent
+
+START_PHOTO = CachedPhoto(START_IMAGE_PATH, START_IMAGE_URL)
 
 # ===========================
 # /start (+ deep-link offer_<id>) — оферта один раз
@@ -518,9 +1071,12 @@ async def on_start(message: Message, state: FSMContext) -> None:
         if not req:
             await message.answer(f"Заявка №{req_id} не найдена.")
             return
+        if req["status"] in ("expired", "closed"):
+            await message.answer(f"Заявка №{req_id} закрыта, отклики больше не принимаются.")
+            return
 
         await state.set_state(OfferCreate.wait_price)
-        await state.update_data(offer_req_id=req_id)
+        await state.update_data(offer_req_id=req_id, offer_key=new_draft_key())
         await message.answer(
             f"Отлично! Введите цену, за которую вы готовы привезти заказ №{req_id} "
             "(учитывайте товар, логистику до вашего города и до Москвы, а также наценку)."
@@ -534,24 +1090,15 @@ async def on_start(message: Message, state: FSMContext) -> None:
 
     caption = "Перед началом использования сервиса просьба ознакомиться с нашей публичной офертой."
 
-    # 1) локальный файл
-    img_path = Path(START_IMAGE_PATH).expanduser().resolve()
-    if img_path.exists() and img_path.is_file():
+    # 1) картинка (локальный файл или URL) — по file_id, если уже загружали
+    if START_PHOTO.available:
         try:
-            await message.answer_photo(FSInputFile(img_path), caption=caption, reply_markup=start_keyboard())
+            await START_PHOTO.answer(message, caption=caption, reply_markup=start_keyboard())
             return
         except Exception as e:
-            print(f"[start-image] local send failed: {e}")
+            print(f"[start-image] send failed: {e}")
 
-    # 2) URL
-    if START_IMAGE_URL:
-        try:
-            await message.answer_photo(START_IMAGE_URL, caption=caption, reply_markup=start_keyboard())
-            return
-        except Exception as e:
-            print(f"[start-image] url send failed: {e}")
-
-    # 3) fallback
+    # 2) fallback
     await message.answer(caption, reply_markup=start_keyboard())
 
 @public_router.callback_query(F.data == ACCEPT_CALLBACK_DATA)
@@ -577,26 +1124,12 @@ async def on_profile(message: Message) -> None:
     if not await ensure_access_or_prompt(message):
         return
     await ensure_profile(message.from_user.id)
-
-    stats_text = await build_profile_stats_text(message.from_user.id)
-    await message.answer(stats_text)
-
-    profile = await get_profile(message.from_user.id)
-    if not has_cdek(profile) or not has_reqs(profile):
-        await message.answer(
-            "Для заказов желательно заполнить контактные данные и реквизиты.",
-            reply_markup=profile_missing_keyboard()
-        )
-    else:
-        await message.answer(
-            f"{fmt_cdek(profile)}\n\n{fmt_reqs(profile)}",
-            reply_markup=profile_missing_keyboard()
-        )
+    await send_profile_screen(message, message.from_user.id)
 
 @public_router.callback_query(F.data == CB_PROFILE_CDEK)
 async def on_profile_cdek(cbq: CallbackQuery, state: FSMContext) -> None:
     await ensure_profile(cbq.from_user.id)
-    profile = await get_profile(cbq.from_user.id)
+    profile = await get_profile_view(cbq.from_user.id)
 
     if has_cdek(profile):
         await cbq.message.answer(
@@ -614,7 +1147,7 @@ async def on_profile_cdek(cbq: CallbackQuery, state: FSMContext) -> None:
 @public_router.callback_query(F.data == CB_PROFILE_REQS)
 async def on_profile_reqs(cbq: CallbackQuery, state: FSMContext) -> None:
     await ensure_profile(cbq.from_user.id)
-    profile = await get_profile(cbq.from_user.id)
+    profile = await get_profile_view(cbq.from_user.id)
 
     if has_reqs(profile):
         await cbq.message.answer(
@@ -632,19 +1165,7 @@ async def on_profile_reqs(cbq: CallbackQuery, state: FSMContext) -> None:
 @public_router.callback_query(F.data == CB_PROFILE_BACK)
 async def on_profile_back(cbq: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
-    stats_text = await build_profile_stats_text(cbq.from_user.id)
-    await cbq.message.answer(stats_text)
-    profile = await get_profile(cbq.from_user.id)
-    if not has_cdek(profile) or not has_reqs(profile):
-        await cbq.message.answer(
-            "Для заказов желательно заполнить контактные данные и реквизиты.",
-            reply_markup=profile_missing_keyboard()
-        )
-    else:
-        await cbq.message.answer(
-            f"{fmt_cdek(profile)}\n\n{fmt_reqs(profile)}",
-            reply_markup=profile_missing_keyboard()
-        )
+    await send_profile_screen(cbq.message, cbq.from_user.id)
     await cbq.answer("Возврат без изменений.")
 
 @public_router.message(ProfileFill.wait_cdek)
@@ -658,7 +1179,7 @@ async def on_cdek_fill(message: Message, state: FSMContext) -> None:
     await save_cdek(message.from_user.id, fio, phone, address)
     await state.clear()
 
-    profile = await get_profile(message.from_user.id)
+    profile = await get_profile_view(message.from_user.id)
     await message.answer("Контактные данные сохранены ✅")
     await message.answer(f"{fmt_cdek(profile)}", reply_markup=profile_missing_keyboard())
 
@@ -673,7 +1194,7 @@ async def on_reqs_fill(message: Message, state: FSMContext) -> None:
     await save_reqs(message.from_user.id, fio, card, bank)
     await state.clear()
 
-    profile = await get_profile(message.from_user.id)
+    profile = await get_profile_view(message.from_user.id)
     await message.answer("Реквизиты сохранены ✅")
     await message.answer(f"{fmt_reqs(profile)}", reply_markup=profile_missing_keyboard())
 
@@ -690,28 +1211,42 @@ async def on_requests_menu(message: Message) -> None:
 async def on_active_requests(message: Message) -> None:
     if not await ensure_access_or_prompt(message):
         return
-    rows = await list_user_requests_ordered(message.from_user.id)
-    if not rows:
+    row = await get_user_request_page(message.from_user.id)
+    if not row:
         await message.answer("Пока активных запросов нет.", reply_markup=requests_keyboard()); return
-    REQ_PAGES[message.from_user.id] = [r["id"] for r in rows]
-    await show_request_slide(message, rows[0], idx=0, total=len(rows))
+    total = await count_user_requests(message.from_user.id)
+    await show_request_slide(message, row, idx=0, total=total)
 
-@public_router.callback_query(F.data.startswith("rl:go:"))
+@public_router.callback_query(F.data.startswith(("rl:p:", "rl:n:")))
 async def on_slider_go(cbq: CallbackQuery) -> None:
     uid = cbq.from_user.id
-    ids = REQ_PAGES.get(uid)
-    if not ids:
-        await cbq.answer("Нет списка заявок."); return
     try:
-        idx = int(cbq.data.split(":")[-1])
+        direction, idx, total, cur_id = cbq.data.split(":")[1:]
+        idx, total, cur_id = int(idx), int(total), int(cur_id)
     except Exception:
         await cbq.answer(); return
-    if not (0 <= idx < len(ids)):
+    if direction == "p":
+        row = await get_user_request_page(uid, after_id=cur_id)
+    else:
+        row = await get_user_request_page(uid, before_id=cur_id)
+    if not row:
+        await cbq.answer("Заявка не найдена."); return
+    await show_request_slide(cbq, row, idx=max(0, min(idx, total - 1)), total=total)
+    await cbq.answer()
+
+@public_router.callback_query(F.data.startswith("rl:go:"))
+async def on_slider_go_legacy(cbq: CallbackQuery) -> None:
+    # кнопки, отправленные до перехода на keyset-пагинацию
+    uid = cbq.from_user.id
+    try:
+        idx = int(cbq.data.split(":")[-1])
+    except Exception:
         await cbq.answer(); return
-    row = await get_request(ids[idx])
+    row = await get_user_request_at(uid, idx) if idx >= 0 else None
     if not row:
         await cbq.answer("Заявка не найдена."); return
-    await show_request_slide(cbq, row, idx=idx, total=len(ids))
+    total = await count_user_requests(uid)
+    await show_request_slide(cbq, row, idx=idx, total=total)
     await cbq.answer()
 
 @public_router.callback_query(F.data == "rl:back")
@@ -722,13 +1257,23 @@ async def on_slider_back(cbq: CallbackQuery) -> None:
 @public_router.callback_query(F.data.startswith("rl:edit:"))
 async def on_slider_edit(cbq: CallbackQuery, state: FSMContext) -> None:
     try:
-        req_id = int(cbq.data.split(":")[-1])
+        parts = cbq.data.split(":")
+        req_id = int(parts[2])
+        # позиция в слайдере (в старых кнопках её нет)
+        idx, total = (int(parts[3]), int(parts[4])) if len(parts) >= 5 else (None, None)
     except Exception:
         await cbq.answer("Некорректные данные.", show_alert=True); return
-    await state.update_data(edit_req_id=req_id)
+    await state.update_data(edit_req_id=req_id, edit_req_idx=idx, edit_req_total=total)
     await cbq.message.answer("Что конкретно вы хотите изменить?", reply_markup=change_existing_kb())
     await cbq.answer()
 
+async def show_edited_slide(cbq_or_msg, data: dict, row: dict) -> None:
+    """Карточка заявки после правки: позиция из FSM (с кнопки), иначе считаем по индексу."""
+    idx, total = data.get("edit_req_idx"), data.get("edit_req_total")
+    if idx is None or total is None:
+        idx, total = await user_request_position(row["user_id"], row["id"])
+    await show_request_slide(cbq_or_msg, row, idx=idx, total=total)
+
 @public_router.callback_query(F.data == "re:back")
 async def on_edit_back(cbq: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
@@ -736,18 +1281,67 @@ async def on_edit_back(cbq: CallbackQuery, state: FSMContext) -> None:
     if not req_id:
         await cbq.answer("Нет контекста.", show_alert=True); return
     # вернёмся к карточке
-    uid = cbq.from_user.id
-    ids = REQ_PAGES.get(uid) or [req_id]
-    try:
-        idx = ids.index(req_id)
-    except Exception:
-        idx = 0
     row = await get_request(req_id)
     if not row:
         await cbq.answer("Заявка не найдена.", show_alert=True); return
-    await show_request_slide(cbq, row, idx=idx, total=len(ids))
+    await show_edited_slide(cbq, data, row)
     await cbq.answer("Возврат к заявке.")
 
+# ---- «Отклики» на карточке заявки: of:{req_id}:{sort}[:{ключ}:{id}] ----
+def offers_page_text(req_id: int, sort: str, offers: list[dict]) -> str:
+    if not offers:
+        return f"💬 Отклики на заявку №{req_id}\n\nОткликов пока нет."
+    lines = [f"💬 Отклики на заявку №{req_id} — {OFFER_SORT_TITLES[sort]}"]
+    for o in offers:
+        lines.append(
+            f"• №{o['id']}: {o['price']:g} ₽, {o['days']} дн., состояние {o['cond']}/10"
+            f"{' 📷' if o.get('photo_file_id') else ''}"
+        )
+    return "\n".join(lines)
+
+async def _edit_card(msg: Message, text: str, kb: InlineKeyboardMarkup) -> None:
+    # карточка может быть фото с подписью — тогда меняем подпись
+    try:
+        if msg.photo:
+            await msg.edit_caption(caption=text, reply_markup=kb)
+        else:
+            await msg.edit_text(text, reply_markup=kb)
+    except Exception as e:
+        print("offers view edit failed:", e)
+        await msg.answer(text, reply_markup=kb)
+
+@public_router.callback_query(F.data.startswith("of:back:"))
+async def on_offers_back(cbq: CallbackQuery) -> None:
+    try:
+        req_id = int(cbq.data.split(":")[2])
+    except Exception:
+        await cbq.answer(); return
+    row = await get_request(req_id)
+    if not row or row["user_id"] != cbq.from_user.id:
+        await cbq.answer("Заявка не найдена."); return
+    idx, total = await user_request_position(row["user_id"], req_id)
+    await show_request_slide(cbq, row, idx=idx, total=total)
+    await cbq.answer()
+
+@public_router.callback_query(F.data.startswith("of:"))
+async def on_offers_page(cbq: CallbackQuery) -> None:
+    try:
+        parts = cbq.data.split(":")
+        req_id, sort = int(parts[1]), parts[2]
+        after = (float(parts[3]), int(parts[4])) if len(parts) >= 5 else None
+        if sort not in OFFER_SORT_KEYS:
+            raise ValueError(sort)
+    except Exception:
+        await cbq.answer("Некорректные данные.", show_alert=True); return
+    row = await get_request(req_id)
+    # отклики видит только автор заявки
+    if not row or row["user_id"] != cbq.from_user.id:
+        await cbq.answer("Заявка не найдена.", show_alert=True); return
+    offers, next_after = await get_offer_page(req_id, sort, after)
+    await _edit_card(cbq.message, offers_page_text(req_id, sort, offers),
+                     offers_kb(req_id, sort, after is None, next_after))
+    await cbq.answer()
+
 # Примеры упрощённых обработчиков изменения полей (без FSM на каждое поле)
 @public_router.callback_query(F.data == "re:ep")
 async def on_edit_private_title(cbq: CallbackQuery, state: FSMContext) -> None:
@@ -782,6 +1376,7 @@ async def req_new_start(message: Message, state: FSMContext) -> None:
         return
     await state.clear()
     await state.set_state(RequestCreate.wait_private_title)
+    await state.update_data(draft_key=new_draft_key())
     await message.answer("Укажите название запроса. Оно будет видно только вам.")
 
 @public_router.message(RequestCreate.wait_private_title)
@@ -799,14 +1394,7 @@ async def req_private_title(message: Message, state: FSMContext) -> None:
         await state.clear()
         row = await get_request(edit_id)
         await message.answer("Личное название обновлено ✅")
-        # показать обновлённую карточку
-        uid = message.from_user.id
-        ids = REQ_PAGES.get(uid) or [edit_id]
-        try:
-            idx = ids.index(edit_id)
-        except Exception:
-            idx = 0
-        await show_request_slide(message, row, idx=idx, total=len(ids))
+        await show_edited_slide(message, data, row)
         return
 
     await state.update_data(draft_private_title=title)
@@ -827,13 +1415,7 @@ async def req_item_title(message: Message, state: FSMContext) -> None:
         await state.clear()
         row = await get_request(edit_id)
         await message.answer("Название обновлено ✅")
-        uid = message.from_user.id
-        ids = REQ_PAGES.get(uid) or [edit_id]
-        try:
-            idx = ids.index(edit_id)
-        except Exception:
-            idx = 0
-        await show_request_slide(message, row, idx=idx, total=len(ids))
+        await show_edited_slide(message, data, row)
         return
 
     await state.update_data(draft_item_title=item)
@@ -854,13 +1436,7 @@ async def req_description(message: Message, state: FSMContext) -> None:
         await state.clear()
         row = await get_request(edit_id)
         await message.answer("Описание обновлено ✅")
-        uid = message.from_user.id
-        ids = REQ_PAGES.get(uid) or [edit_id]
-        try:
-            idx = ids.index(edit_id)
-        except Exception:
-            idx = 0
-        await show_request_slide(message, row, idx=idx, total=len(ids))
+        await show_edited_slide(message, data, row)
         return
 
     await state.update_data(draft_description=desc)
@@ -881,13 +1457,7 @@ async def req_take_photo(message: Message, state: FSMContext) -> None:
             await state.clear()
             row = await get_request(edit_id)
             await message.answer("Фото обновлено ✅")
-            uid = message.from_user.id
-            ids = REQ_PAGES.get(uid) or [edit_id]
-            try:
-                idx = ids.index(edit_id)
-            except Exception:
-                idx = 0
-            await show_request_slide(message, row, idx=idx, total=len(ids))
+            await show_edited_slide(message, data, row)
             return
 
         await state.update_data(draft_photo_file_id=ph.file_id)
@@ -911,11 +1481,23 @@ async def req_confirm(cbq: CallbackQuery, state: FSMContext) -> None:
         await cbq.answer("Не все поля заполнены.", show_alert=True)
         return
 
-    new_id = await insert_request(cbq.from_user.id, pt, it, ds, ph)
+    key = submission_key("r", cbq.from_user.id, data.get("draft_key"), cbq)
+    if not claim_submission(key):
+        await cbq.answer("Заявка уже отправлена ✅")
+        return
+    try:
+        new_id, created = await insert_request(cbq.from_user.id, pt, it, ds, ph, idem_key=key)
+    except Exception:
+        SUBMITTED.pop(key)
+        raise
+    if not created:   # другой процесс / до рестарта — уже в БД, модерацию второй раз не зовём
+        await state.clear()
+        await cbq.answer("Заявка уже отправлена ✅")
+        return
     row = await get_request(new_id)
 
-    # уведомляем модераторскую беседу
-    await notify_admin_group(cbq.bot, row, cbq.from_user.id)
+    # уведомляем модераторскую беседу (в фоне, через очередь)
+    notify_admin_group(cbq.bot, row, cbq.from_user.id)
 
     await state.clear()
     await cbq.message.answer("Отлично! Ваша заявка отправлена на модерацию, вам придет уведомление когда она будет опубликована. ♻️")
@@ -976,9 +1558,7 @@ async def offer_pick_condition(cbq: CallbackQuery, state: FSMContext) -> None:
     await state.set_state(OfferCreate.wait_photo)
     await cbq.message.answer(
         "Если у вас есть фото товара — прикрепите его одним сообщением.\nИли нажмите «Пропустить».",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔘 Пропустить", callback_data=CB_OFFER_SKIP_PHOTO)]
-        ])
+        reply_markup=offer_photo_or_skip_kb()
     )
     await cbq.answer()
 
@@ -1007,7 +1587,21 @@ async def _finalize_offer(cbq_or_msg, state: FSMContext, photo_id: str | None) -
         await msg.answer("Контекст отклика утерян. Повторите переход по кнопке «Откликнуться».")
         return
 
-    offer_id = await insert_offer(int(req_id), seller, float(price), int(days), int(cond), photo_id)
+    msg = cbq_or_msg.message if isinstance(cbq_or_msg, CallbackQuery) else cbq_or_msg
+    key = submission_key("o", seller, data.get("offer_key"), cbq_or_msg)
+    if not claim_submission(key):
+        await msg.answer("Отклик уже отправлен ✅")
+        return
+    try:
+        offer_id, created = await insert_offer(int(req_id), seller, float(price), int(days), int(cond),
+                                               photo_id, idem_key=key)
+    except Exception:
+        SUBMITTED.pop(key)
+        raise
+    if not created:   # другой процесс / до рестарта — уже в БД, автора второй раз не зовём
+        await state.clear()
+        await msg.answer("Отклик уже отправлен ✅")
+        return
 
     summary = (
         f"✅ Отклик отправлен (№{offer_id})\n"
@@ -1018,85 +1612,118 @@ async def _finalize_offer(cbq_or_msg, state: FSMContext, photo_id: str | None) -
         f"• Фото: {'есть' if photo_id else 'нет'}"
     )
 
-    if isinstance(cbq_or_msg, CallbackQuery):
-        msg = cbq_or_msg.message
-        if photo_id:
-            await msg.answer_photo(photo_id, caption=summary)
-        else:
-            await msg.answer(summary)
+    if photo_id:
+        await msg.answer_photo(photo_id, caption=summary)
     else:
+        await msg.answer(summary)
+
+    # Уведомим автора заявки (в фоне, через очередь); в окне после первого — только дайджест
+    req = await get_request(int(req_id))
+    if req and await OFFER_DIGEST.add(req["user_id"], int(req_id), float(price)):
+        bot, author_id = cbq_or_msg.bot, req["user_id"]
+        text_for_author = (
+            f"🙋 На вашу заявку №{req_id} пришёл отклик!\n"
+            f"Цена: {price}\nСроки: {days} дн.\nСостояние: {cond}/10"
+        )
         if photo_id:
-            await cbq_or_msg.answer_photo(photo_id, caption=summary)
+            OUTBOX.submit(lambda: bot.send_photo(author_id, photo_id, caption=text_for_author),
+                          label=f"offer #{offer_id} -> author")
         else:
-            await cbq_or_msg.answer(summary)
-
-    # Уведомим автора заявки
-    try:
-        req = await get_request(int(req_id))
-        if req:
-            text_for_author = (
-                f"🙋 На вашу заявку №{req_id} пришёл отклик!\n"
-                f"Цена: {price}\nСроки: {days} дн.\nСостояние: {cond}/10"
-            )
-            if photo_id:
-                await cbq_or_msg.bot.send_photo(req["user_id"], photo_id, caption=text_for_author)
-            else:
-                await cbq_or_msg.bot.send_message(req["user_id"], text_for_author)
-    except Exception as e:
-        print("notify author warn:", e)
+            OUTBOX.submit(lambda: bot.send_message(author_id, text_for_author),
+                          label=f"offer #{offer_id} -> author")
 
     await state.clear()
 
 # ===========================
 # МОДЕРАЦИЯ (approve / reject)
 # ===========================
+async def publish_request(bot: Bot, row: dict, bot_username: str) -> None:
+    text = build_public_post_text(row)
+    kb = public_offer_kb(bot_username, row["id"])
+    if row.get("photo_file_id"):
+        await bot.send_photo(PUBLISH_CHANNEL_ID, row["photo_file_id"], caption=text, reply_markup=kb)
+    else:
+        await bot.send_message(PUBLISH_CHANNEL_ID, text, reply_markup=kb)
+
+# Публикации идут фоновыми задачами уже после ответа модератору (лимит канала ~20/мин, правки
+# в чате модерации); на остановке процесса их немного дожидаемся. Что не успело — остаётся
+# approved с пустым published_at и допубликовывается на старте (resume_publishing).
+PUBLISH_TASKS: set[asyncio.Task] = set()
+
+def spawn_publish(coro) -> None:
+    task = asyncio.create_task(coro)
+    PUBLISH_TASKS.add(task)
+    task.add_done_callback(PUBLISH_TASKS.discard)
+
+def notify_author_approved(bot: Bot, row: dict) -> None:
+    req_id, author_id = row["id"], row["user_id"]
+    OUTBOX.submit(
+        lambda: bot.send_message(author_id, f"✅ Заявка №{req_id} прошла модерацию и уже выставлена в канал."),
+        label=f"approve #{req_id} -> author"
+    )
+
+def notify_author_rejected(bot: Bot, row: dict, reason: str) -> None:
+    req_id, author_id = row["id"], row["user_id"]
+    OUTBOX.submit(
+        lambda: bot.send_message(
+            author_id,
+            f"❌ Ваша заявка №{req_id} не прошла модерацию. Причина: {reason}\n"
+            "Пожалуйста внесите изменения и отправьте на повторную проверку."
+        ),
+        label=f"reject #{req_id} -> author"
+    )
+
 @mod_router.callback_query(F.data.startswith("adm:ok:"))
-async def admin_approve(cbq: CallbackQuery) -> None:
+async def admin_approve(cbq: CallbackQuery, bot_info: BotInfo) -> None:
     try:
         req_id = int(cbq.data.split(":")[-1])
     except Exception:
         await cbq.answer("Некорректные данные.", show_alert=True); return
 
-    row = await get_request(req_id)
-    if not row:
-        await cbq.answer("Заявка не найдена.", show_alert=True); return
-    if row["status"] != "pending":
-        await cbq.answer("Заявка уже промодерирована."); return
-
-    await update_request_status(req_id, "approved")
-
-    # уведомляем автора
-    try:
-        await cbq.bot.send_message(row["user_id"], f"✅ Заявка №{req_id} прошла модерацию и уже выставлена в канал.")
-    except Exception as e:
-        print("warn DM:", e)
-
-    # публикация в канал
+    # pending -> approved одним UPDATE … RETURNING: из двух одновременных нажатий (или «одобрить»
+    # против «отклонить») строку получит только один, второй ничего не публикует и не шлёт
+    rows = await moderate_batch([req_id], "approved")
+    if not rows:
+        await cbq.answer("Заявка уже обработана или не найдена."); return
+    row = rows[0]
+    # отвечаем сразу: публикация и правки упираются в лимиты и могут не уложиться во время колбэка
+    await cbq.answer("Одобрено ✅ Публикую…")
+
+    # уведомляем автора (в фоне, через очередь)
+    notify_author_approved(cbq.bot, row)
+    spawn_publish(finish_approve(cbq.bot, bot_info, row, cbq.message.chat.id, cbq.message.message_id))
+
+async def finish_approve(bot: Bot, bot_info: BotInfo, row: dict, chat_id: int, message_id: int) -> None:
+    """Фон после одобрения одной заявки: канал, карточка в модерации, рассылка продавцам."""
+    mark_background()
+    req_id = row["id"]
     try:
-        me = await cbq.bot.get_me()
-        text = build_public_post_text(row)
-        kb = public_offer_kb(me.username, req_id)
-        if row.get("photo_file_id"):
-            await cbq.bot.send_photo(PUBLISH_CHANNEL_ID, row["photo_file_id"], caption=text, reply_markup=kb)
-        else:
-            await cbq.bot.send_message(PUBLISH_CHANNEL_ID, text, reply_markup=kb)
+        me = await bot_info.get(bot)
+        await publish_request(bot, row, me.username)
+        await mark_published(req_id)
     except Exception as e:
         print("publish error:", e)
-        await cbq.answer("Нет прав публиковать в канал.", show_alert=True); return
+        text = f"⚠️ №{req_id} одобрена, но не опубликована: {e}"
+        OUTBOX.submit(lambda: bot.send_message(MODERATION_CHAT_ID, text), label=f"approve #{req_id} report")
+        return
 
     # убираем кнопки под карточкой в модерации
     try:
-        row2 = await get_request(req_id)
-        t = request_preview_text(row2)
-        if row2.get("photo_file_id"):
-            await cbq.message.edit_media(InputMediaPhoto(media=row2["photo_file_id"], caption=t))
+        t = request_preview_text(row)
+        if row.get("photo_file_id"):
+            await bot.edit_message_media(chat_id=chat_id, message_id=message_id,
+                                         media=InputMediaPhoto(media=row["photo_file_id"], caption=t),
+                                         reply_markup=None)
         else:
-            await cbq.message.edit_text(t)
-        await cbq.message.edit_reply_markup(reply_markup=None)
+            await bot.edit_message_text(t, chat_id=chat_id, message_id=message_id, reply_markup=None)
     except Exception as e:
         print("edit moderation msg:", e)
 
-    await cbq.answer("Одобрено и опубликовано ✅")
+    # рассылка подписанным продавцам — в фоне, прогресс в таблице broadcasts
+    try:
+        await BROADCASTER.start(bot, row)
+    except Exception as e:
+        print("broadcast start error:", e)
 
 @mod_router.callback_query(F.data.startswith("adm:rej:"))
 async def admin_reject_start(cbq: CallbackQuery, state: FSMContext) -> None:
@@ -1114,7 +1741,7 @@ async def admin_reject_start(cbq: CallbackQuery, state: FSMContext) -> None:
     await cbq.message.answer("Укажите причину отклонения (одним сообщением).")
     await cbq.answer("Жду причину…")
 
-@mod_router.message(AdminReject.waiting_reason)
+@mod_router.message(AdminReject.waiting_reason, F.text, ~F.text.startswith("/"))   # команды (/search, /queue…) — не причина
 async def admin_reject_reason(message: Message, state: FSMContext) -> None:
     if message.chat.id != MODERATION_CHAT_ID:
         return
@@ -1130,40 +1757,384 @@ async def admin_reject_reason(message: Message, state: FSMContext) -> None:
     if not reason:
         await message.answer("Причина не может быть пустой. Напишите текст причины."); return
 
-    await update_request_status(req_id, "rejected", reason)
-    row = await get_request(req_id)
+    rows = await moderate_batch([req_id], "rejected", reason)
+    if not rows:   # успели одобрить/отклонить раньше — автору и карточке ничего не шлём
+        await state.clear()
+        await message.answer("Заявка уже обработана.")
+        return
+    row = rows[0]
 
-    try:
-        await message.bot.send_message(
-            row["user_id"],
-            f"❌ Ваша заявка №{req_id} не прошла модерацию. Причина: {reason}\n"
-            "Пожалуйста внесите изменения и отправьте на повторную проверку."
-        )
-    except Exception as e:
-        print("warn DM reject:", e)
+    # автору и правка карточки в модерации — в фоне, через очередь
+    bot = message.bot
+    notify_author_rejected(bot, row, reason)
 
-    try:
-        t = request_preview_text(row)
-        if row.get("photo_file_id"):
-            await message.bot.edit_message_media(
-                chat_id=data["admin_chat_id"],
-                message_id=data["admin_msg_id"],
-                media=InputMediaPhoto(media=row["photo_file_id"], caption=t),
+    t = request_preview_text(row)
+    admin_chat_id, admin_msg_id = data["admin_chat_id"], data["admin_msg_id"]
+    photo_id = row.get("photo_file_id")
+    if photo_id:
+        OUTBOX.submit(
+            lambda: bot.edit_message_media(
+                chat_id=admin_chat_id,
+                message_id=admin_msg_id,
+                media=InputMediaPhoto(media=photo_id, caption=t),
                 reply_markup=None
-            )
-        else:
-            await message.bot.edit_message_text(
-                chat_id=data["admin_chat_id"],
-                message_id=data["admin_msg_id"],
+            ),
+            label=f"reject #{req_id} moderation card"
+        )
+    else:
+        OUTBOX.submit(
+            lambda: bot.edit_message_text(
+                chat_id=admin_chat_id,
+                message_id=admin_msg_id,
                 text=t,
                 reply_markup=None
-            )
-    except Exception as e:
-        print("edit moderation msg (reject):", e)
+            ),
+            label=f"reject #{req_id} moderation card"
+        )
 
     await state.clear()
     await message.answer("Отклонено ❌")
 
+@mod_router.message(F.text.startswith("/broadcasts"))
+async def admin_broadcasts(message: Message) -> None:
+    rows = await BROADCASTER.progress()
+    if not rows:
+        await message.answer("Рассылок пока не было."); return
+    lines = [
+        f"№{r['request_id']}: {r['sent'] + r['failed']}/{r['total']} "
+        f"(ок {r['sent']}, ошибок {r['failed']}) — {'идёт' if r['status'] == 'running' else 'готово'}"
+        for r in rows
+    ]
+    await message.answer("📬 Рассылки:\n" + "\n".join(lines))
+
+# ===========================
+# ОЧЕРЕДЬ МОДЕРАЦИИ: /queue — страницы pending, отметки, одобрить/отклонить пачкой
+# ===========================
+# Позиция и отметки — в FSM-данных модератора (в чате ключ FSM — чат + пользователь, у каждого
+# модератора своя выборка): queue_after — id перед текущей страницей, queue_sel — отмеченные id.
+# Статусы меняются одной транзакцией (moderate_batch), публикация в канал — в фоне, параллельно
+# (лимиты канала держит RateLimitMiddleware), авторам — через OUTBOX; итог по каждой заявке
+# приходит в чат отдельным сообщением.
+
+def _short(text: str | None, n: int) -> str:
+    text = (text or "—").replace("\n", " ")
+    return text if len(text) <= n else text[:n - 1] + "…"
+
+def queue_kb(rows: list[dict], selected: set[int], first_page: bool, has_more: bool) -> InlineKeyboardMarkup:
+    kb = [
+        [InlineKeyboardButton(text=f"{'☑️' if r['id'] in selected else '⬜️'} №{r['id']} {_short(r['item_title'], 28)}",
+                              callback_data=f"q:t:{r['id']}")]
+        for r in rows
+    ]
+    nav = []
+    if not first_page:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data="q:s"))
+    if rows:
+        nav.append(InlineKeyboardButton(text="Отметить страницу", callback_data="q:a"))
+    if has_more:
+        nav.append(InlineKeyboardButton(text="Дальше ▶️", callback_data=f"q:n:{rows[-1]['id']}"))
+    if nav:
+        kb.append(nav)
+    if selected:
+        kb.append([InlineKeyboardButton(text=f"✅ Одобрить ({len(selected)})",  callback_data="q:ok"),
+                   InlineKeyboardButton(text=f"❌ Отклонить ({len(selected)})", callback_data="q:rej")])
+        kb.append([InlineKeyboardButton(text="Снять отметки", callback_data="q:c")])
+    kb.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="q:r")])
+    return InlineKeyboardMarkup(inline_keyboard=kb)
+
+async def render_queue(after_id: int, selected: set[int]) -> tuple[str, InlineKeyboardMarkup, int]:
+    """(текст, клавиатура, after_id) — если страница опустела, откатываемся в начало."""
+    rows, has_more = await get_pending_page(after_id)
+    if not rows and after_id:
+        after_id = 0
+        rows, has_more = await get_pending_page(0)
+    lines = [f"📋 Очередь модерации: {await count_pending()}"]
+    lines += [
+        f"№{r['id']} — {_short(r['item_title'], 60)} (от user_id={r['user_id']}){' 📷' if r['photo_file_id'] else ''}"
+        for r in rows
+    ]
+    if not rows:
+        lines.append("Пусто — всё промодерировано.")
+    elsewhere = len(selected - {r["id"] for r in rows})
+    if selected:
+        lines.append(f"\nОтмечено: {len(selected)}" + (f" (на других страницах: {elsewhere})" if elsewhere else ""))
+    return "\n".join(lines), queue_kb(rows, selected, after_id == 0, has_more), after_id
+
+async def _edit_queue(bot: Bot, chat_id: int, message_id: int, text: str, kb: InlineKeyboardMarkup) -> None:
+    try:
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=kb)
+    except Exception as e:   # в т.ч. «message is not modified» на «Обновить» без изменений
+        print("queue edit failed:", e)
+
+def _skipped_lines(selected, rows: list[dict]) -> list[str]:
+    done = {r["id"] for r in rows}
+    return [f"№{i} — уже промодерирована, пропущена" for i in sorted(set(selected) - done)]
+
+async def publish_batch(bot: Bot, bot_info: BotInfo, rows: list[dict], skipped: list[str],
+                        title: str = "Итог одобрения") -> None:
+    mark_background()   # лимит канала (~20/мин) ждёт эта задача, а не апдейт модератора
+    try:
+        username = (await bot_info.get(bot)).username
+    except Exception as e:   # без @username не собрать ссылку «Откликнуться»
+        print("publish batch: bot info unavailable:", e)
+        text = f"⚠️ Одобрено {len(rows)}, но публикация не удалась: {e}"
+        OUTBOX.submit(lambda: bot.send_message(MODERATION_CHAT_ID, text), label="queue approve report")
+        return
+    sem = asyncio.Semaphore(QUEUE_PUBLISH_CONCURRENCY)
+
+    async def one(row: dict) -> str:
+        async with sem:
+            try:
+                await publish_request(bot, row, username)
+                await mark_published(row["id"])
+            except Exception as e:
+                print(f"publish error #{row['id']}:", e)
+                return f"№{row['id']} ⚠️ одобрена, но не опубликована: {e}"
+        try:
+            recipients = await BROADCASTER.start(bot, row)
+        except Exception as e:
+            print("broadcast start error:", e)
+            recipients = 0
+        return f"№{row['id']} ✅ опубликована" + (f", рассылка: {recipients}" if recipients else "")
+
+    results = await asyncio.gather(*(one(r) for r in rows))
+    text = f"{title} ({len(rows)}):\n" + "\n".join([*results, *skipped])
+    OUTBOX.submit(lambda: bot.send_message(MODERATION_CHAT_ID, text), label="queue approve report")
+
+async def resume_publishing(bot: Bot, bot_info: BotInfo) -> int:
+    """На старте: одобренные до рестарта, но не опубликованные — в фон, итог в чат модерации."""
+    rows = await list_unpublished()
+    if rows:
+        print(f"[publish] resuming {len(rows)} approved request(s)")
+        spawn_publish(publish_batch(bot, bot_info, rows, [], title="Допубликовано после перезапуска"))
+    return len(rows)
+
+@mod_router.message(F.text.startswith("/queue"))
+async def admin_queue(message: Message, state: FSMContext) -> None:
+    await state.set_state(None)   # недописанная причина пачки больше не ждёт
+    text, kb, _ = await render_queue(0, set())
+    await state.update_data(queue_after=0, queue_sel=[])
+    await message.answer(text, reply_markup=kb)
+
+@mod_router.callback_query(F.data.startswith("q:"))
+async def admin_queue_action(cbq: CallbackQuery, state: FSMContext, bot_info: BotInfo) -> None:
+    data = await state.get_data()
+    after_id = data.get("queue_after", 0)
+    selected = set(data.get("queue_sel") or [])
+    action, _, arg = cbq.data[2:].partition(":")
+    try:
+        arg_id = int(arg) if arg else None
+    except Exception:
+        await cbq.answer("Некорректные данные.", show_alert=True); return
+
+    if action == "t" and arg_id:
+        if arg_id in selected:
+            selected.discard(arg_id)
+        elif len(selected) >= QUEUE_BATCH_MAX:
+            await cbq.answer(f"За раз — не больше {QUEUE_BATCH_MAX}.", show_alert=True); return
+        else:
+            selected.add(arg_id)
+    elif action == "a":
+        rows, _ = await get_pending_page(after_id)
+        for r in rows:
+            if len(selected) >= QUEUE_BATCH_MAX:
+                break
+            selected.add(r["id"])
+    elif action == "c":
+        selected.clear()
+    elif action == "s":
+        after_id = 0
+    elif action == "n" and arg_id:
+        after_id = arg_id
+    elif action == "ok":
+        await queue_approve(cbq, state, bot_info, selected, after_id); return
+    elif action == "rej":
+        if not selected:
+            await cbq.answer("Ничего не отмечено."); return
+        await state.set_state(AdminReject.waiting_batch_reason)
+        await state.update_data(queue_msg_id=cbq.message.message_id)
+        await cbq.message.answer(f"Укажите причину отклонения для {len(selected)} заявок (одним сообщением).")
+        await cbq.answer("Жду причину…"); return
+
+    text, kb, after_id = await render_queue(after_id, selected)
+    await state.update_data(queue_after=after_id, queue_sel=sorted(selected))
+    await _edit_queue(cbq.bot, cbq.message.chat.id, cbq.message.message_id, text, kb)
+    await cbq.answer()
+
+async def queue_approve(cbq: CallbackQuery, state: FSMContext, bot_info: BotInfo,
+                        selected: set[int], after_id: int) -> None:
+    if not selected:
+        await cbq.answer("Ничего не отмечено."); return
+    rows = await moderate_batch(sorted(selected), "approved")
+    await cbq.answer(f"Одобрено: {len(rows)}. Публикую…" if rows else "Все отмеченные уже промодерированы.")
+
+    bot = cbq.bot
+    for row in rows:
+        notify_author_approved(bot, row)
+    # публикация может упереться в лимит канала (~20/мин) — не держим апдейт модератора
+    spawn_publish(publish_batch(bot, bot_info, rows, _skipped_lines(selected, rows)))
+
+    text, kb, after_id = await render_queue(after_id, set())
+    await state.update_data(queue_after=after_id, queue_sel=[])
+    await _edit_queue(bot, cbq.message.chat.id, cbq.message.message_id, text, kb)
+
+@mod_router.message(AdminReject.waiting_batch_reason, F.text, ~F.text.startswith("/"))   # команды (/search, /queue…) — не причина
+async def admin_queue_reject_reason(message: Message, state: FSMContext) -> None:
+    data = await state.get_data()
+    selected = data.get("queue_sel") or []
+    reason = _cleanup(message.text)
+    if not reason:
+        await message.answer("Причина не может быть пустой. Напишите текст причины."); return
+
+    rows = await moderate_batch(selected, "rejected", reason)
+    for row in rows:
+        notify_author_rejected(message.bot, row, reason)
+    await state.set_state(None)
+
+    lines = [f"№{r['id']} ❌ отклонена" for r in rows] + _skipped_lines(selected, rows)
+    await message.answer(f"Итог отклонения ({len(rows)}):\n" + "\n".join(lines))
+
+    text, kb, after_id = await render_queue(data.get("queue_after", 0), set())
+    await state.update_data(queue_after=after_id, queue_sel=[])
+    if data.get("queue_msg_id"):
+        await _edit_queue(message.bot, message.chat.id, data["queue_msg_id"], text, kb)
+
+# ===========================
+# ПОДПИСКИ ПРОДАВЦОВ: /subscribe, /unsubscribe, /subscriptions
+# ===========================
+SUBSCRIBE_HELP = (
+    "Подписка на новые заявки по ключевым словам из названия/описания.\n"
+    "/subscribe iphone наушники — подписаться (слова через пробел)\n"
+    "/subscribe все — получать все заявки\n"
+    "/unsubscribe iphone — отписаться от слова, /unsubscribe все — от всего\n"
+    "/subscriptions — мои подписки"
+)
+
+def parse_keywords(text: str | None) -> list[str]:
+    _, _, args = (text or "").partition(" ")
+    words = [ALL_KEYWORD if w in ("все", "всё") else w for w in keyword_tokens(args)]
+    if ALL_KEYWORD in args:
+        words.append(ALL_KEYWORD)
+    return list(dict.fromkeys(words))
+
+def fmt_keyword(k: str) -> str:
+    return "все заявки" if k == ALL_KEYWORD else k
+
+@public_router.message(F.text.startswith("/subscriptions"))
+async def on_subscriptions(message: Message) -> None:
+    if not await ensure_access_or_prompt(message):
+        return
+    words = await list_subscriptions(message.from_user.id)
+    if not words:
+        await message.answer("Подписок нет.\n\n" + SUBSCRIBE_HELP); return
+    await message.answer("Ваши подписки: " + ", ".join(fmt_keyword(k) for k in words))
+
+@public_router.message(F.text.startswith("/subscribe"))
+async def on_subscribe(message: Message) -> None:
+    if not await ensure_access_or_prompt(message):
+        return
+    words = parse_keywords(message.text)
+    if not words:
+        await message.answer(SUBSCRIBE_HELP); return
+    added, total = await add_subscriptions(message.from_user.id, words)
+    if not added:
+        await message.answer(f"Новых слов нет (лимит — {SUBSCRIPTIONS_PER_USER}, у вас {total})."); return
+    await message.answer(f"Подписка оформлена: {', '.join(fmt_keyword(k) for k in added)}.")
+
+@public_router.message(F.text.startswith("/unsubscribe"))
+async def on_unsubscribe(message: Message) -> None:
+    if not await ensure_access_or_prompt(message):
+        return
+    words = parse_keywords(message.text)
+    if not words:
+        await message.answer(SUBSCRIBE_HELP); return
+    removed = await remove_subscriptions(message.from_user.id, None if ALL_KEYWORD in words else words)
+    await message.answer(f"Удалено подписок: {removed}.")
+
+# ===========================
+# ПОИСК: /search (и в модерации) + inline-режим
+# ===========================
+async def render_search_page(bot: Bot, bot_info: BotInfo, query: str, cursor: str | None,
+                             include_all: bool) -> tuple[str, InlineKeyboardMarkup | None]:
+    rows, next_cursor = await search_requests(query, cursor, SEARCH_PAGE_SIZE, include_all)
+    if not rows:
+        return ("Ничего не найдено." if cursor is None else "Больше результатов нет."), None
+    lines, buttons = [f"🔎 «{query}»:"], []
+    username = None if include_all else (await bot_info.get(bot)).username
+    for r in rows:
+        status = f" ({r['status']})" if include_all else ""
+        lines.append(f"• №{r['id']} — {r['item_title']}{status}\n   {r['snip'] or ''}")
+        if username:
+            buttons.append([InlineKeyboardButton(text=f"Откликнуться на №{r['id']}",
+                                                 url=f"https://t.me/{username}?start=offer_{r['id']}")])
+    nav = []
+    if cursor is not None:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data="srch:start"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton(text="Ещё ▶️", callback_data=f"srch:{next_cursor}"))
+    if nav:
+        buttons.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons) if buttons else None
+
+async def on_search(message: Message, state: FSMContext, bot_info: BotInfo, include_all: bool) -> None:
+    _, _, query = (message.text or "").partition(" ")
+    query = _cleanup(query)
+    if not fts_query(query):
+        await message.answer("Напишите, что искать: /search iphone 13"); return
+    # запрос — в FSM-данных: в callback_data (64 байта) он может не поместиться
+    await state.update_data(search_q=query)
+    text, kb = await render_search_page(message.bot, bot_info, query, None, include_all)
+    await message.answer(text, reply_markup=kb)
+
+async def on_search_page(cbq: CallbackQuery, state: FSMContext, bot_info: BotInfo, include_all: bool) -> None:
+    query = (await state.get_data()).get("search_q")
+    if not query:
+        await cbq.answer("Поиск устарел, повторите /search.", show_alert=True); return
+    cursor = cbq.data.split(":", 1)[1]
+    text, kb = await render_search_page(cbq.bot, bot_info, query, None if cursor == "start" else cursor, include_all)
+    try:
+        await cbq.message.edit_text(text, reply_markup=kb)
+    except Exception as e:
+        print("search page edit failed:", e)
+    await cbq.answer()
+
+@public_router.message(F.text.startswith("/search"))
+async def on_public_search(message: Message, state: FSMContext, bot_info: BotInfo) -> None:
+    if not await ensure_access_or_prompt(message):
+        return
+    await on_search(message, state, bot_info, include_all=False)
+
+@public_router.callback_query(F.data.startswith("srch:"))
+async def on_public_search_page(cbq: CallbackQuery, state: FSMContext, bot_info: BotInfo) -> None:
+    await on_search_page(cbq, state, bot_info, include_all=False)
+
+# модераторы ищут по всем заявкам, включая pending/rejected
+@mod_router.message(F.text.startswith("/search"))
+async def on_mod_search(message: Message, state: FSMContext, bot_info: BotInfo) -> None:
+    await on_search(message, state, bot_info, include_all=True)
+
+@mod_router.callback_query(F.data.startswith("srch:"))
+async def on_mod_search_page(cbq: CallbackQuery, state: FSMContext, bot_info: BotInfo) -> None:
+    await on_search_page(cbq, state, bot_info, include_all=True)
+
+@public_router.inline_query()
+async def on_inline_search(iq: InlineQuery, bot_info: BotInfo) -> None:
+    # offset inline-запроса — наш курсор 'уровень:id'
+    rows, next_cursor = await search_requests(iq.query, iq.offset or None, SEARCH_INLINE_PAGE_SIZE)
+    username = (await bot_info.get(iq.bot)).username if rows else ""
+    results = [
+        InlineQueryResultArticle(
+            id=str(r["id"]),
+            title=f"№{r['id']} — {r['item_title']}",
+            description=r["snip"] or None,
+            input_message_content=InputTextMessageContent(message_text=build_public_post_text(r)),
+            reply_markup=public_offer_kb(username, r["id"]),
+        )
+        for r in rows
+    ]
+    await iq.answer(results, cache_time=30, is_personal=False,
+                    next_offset=next_cursor or "")
+
 # ===========================
 # Навигация/фолбек
 # ===========================
@@ -1179,9 +2150,49 @@ async def any_message(message: Message) -> None:
         return
     await message.answer("Команда принята.", reply_markup=menu_keyboard())
 
+# ===========================
+# Исходящие: лимиты на все вызовы API + фоновая очередь уведомлений
+# ===========================
+LIMITER = RateLimiter()
+OUTBOX = OutboundQueue()
+
+def setup_bot_session(bot: Bot) -> None:
+    bot.session.middleware(RateLimitMiddleware(LIMITER))
+
 # ===========================
 # Entry Point
 # ===========================
+def register_metrics_gauges() -> None:
+    METRICS.register_gauges("accepted_cache", accepted_cache_stats)
+    METRICS.register_gauges("profile_view_cache", PROFILE_VIEW_CACHE.stats)
+    METRICS.register_gauges("submit_dedup", SUBMITTED.stats)
+    METRICS.register_gauges("profile_writer_known", PROFILE_WRITER.known.stats)
+    METRICS.register_gauges("keyboards", keyboard_cache_stats)
+    METRICS.register_gauges("outbox", OUTBOX.stats)
+    METRICS.register_gauges("offer_digest", OFFER_DIGEST.stats)
+    METRICS.register_gauges("rate_limit", lambda: {"waited_seconds": LIMITER.waited})
+    METRICS.register_gauges("bot_info", BOT_INFO.stats)
+
+def build_dispatcher() -> Dispatcher:
+    # FSM подключаем сами: контекст метрик должен открыться раньше, чем FSM прочитает состояние.
+    # events_isolation — очередь апдейтов по ключу FSM (см. ordering.py)
+    isolation = ReleasingEventIsolation() if SERIALIZE_UPDATES else None
+    dp = Dispatcher(storage=SqliteStorage() if FSM_STORAGE == "sqlite" else MemoryStorage(),
+                    events_isolation=isolation, disable_fsm=True)
+    dp.include_router(public_router)
+    dp.include_router(mod_router)
+    dp["bot_info"] = BOT_INFO   # хендлеры получают аргументом bot_info
+    if METRICS_ENABLED:
+        setup_metrics(dp, public_router, mod_router)
+        register_metrics_gauges()
+    dp.update.outer_middleware(dp.fsm)
+    if UPDATE_CONCURRENCY:
+        limiter = dp.update.outer_middleware(ConcurrencyLimitMiddleware(UPDATE_CONCURRENCY))
+        METRICS.register_gauges("update_concurrency", limiter.stats)
+    if isolation is not None:
+        METRICS.register_gauges("update_ordering", isolation.stats)
+    return dp
+
 async def main() -> None:
     if not BOT_TOKEN:
         raise RuntimeError("Укажи токен в config.py -> BOT_TOKEN")
@@ -1189,16 +2200,55 @@ async def main() -> None:
     # создаём/мигрируем БД (всё внутри config.init_db)
     await init_db()
 
-    # предупреждение, если не найдено стартовое изображение
-    p = Path(START_IMAGE_PATH).expanduser().resolve()
-    if not p.exists() and not START_IMAGE_URL:
-        print(f"[info] Стартовое изображение не задано: {p} и START_IMAGE_URL пуст. Будет использован текст без фото.")
+    warm_keyboards()
 
+    # один пул соединений на весь процесс
+    await open_db_pool()
+    PROFILE_WRITER.start()
     bot = Bot(BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
-    dp.include_router(public_router)
-    dp.include_router(mod_router)
-    await dp.start_polling(bot)
+    setup_bot_session(bot)
+    jobs = metrics_log = None
+    # всё, что дальше, может упасть (getMe/getChat, файл картинки) — пул, писатель и сессию закроет finally
+    try:
+        # стартовое изображение: путь/хэш/file_id — один раз здесь, а не на каждый /start
+        await START_PHOTO.prepare()
+
+        # @username для ссылок «Откликнуться» и сведения о каналах — один раз, дальше из кэша
+        await BOT_INFO.load(bot)
+        print(f"[botinfo] {BOT_INFO.summary()}")
+        OUTBOX.start()
+        OFFER_DIGEST.start(bot)
+        # незаконченные рассылки продолжаем с сохранённого курсора
+        await BROADCASTER.resume(bot)
+        # одобренные, но не доехавшие до канала (рестарт посреди публикации)
+        await resume_publishing(bot, BOT_INFO)
+        dp = build_dispatcher()
+        # сроки заявок, архив, протухшие черновики FSM
+        jobs = build_maintenance_scheduler(dp.storage)
+        jobs.start()
+        METRICS.register_gauges("jobs", jobs.stats)
+        metrics_log = (asyncio.create_task(METRICS.log_loop())
+                       if METRICS_ENABLED and METRICS_LOG_INTERVAL > 0 else None)
+        if RUN_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if metrics_log:
+            metrics_log.cancel()
+        # недоделанные публикации: немного ждём, остальное — отменяем
+        if PUBLISH_TASKS:
+            _, pending = await asyncio.wait(set(PUBLISH_TASKS), timeout=10)
+            for t in pending:
+                t.cancel()
+        if jobs:
+            await jobs.stop()
+        await BROADCASTER.stop()
+        await OFFER_DIGEST.stop()
+        await OUTBOX.stop()
+        await PROFILE_WRITER.stop()
+        await close_db_pool()
+        await bot.session.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,274 @@
+# metrics.py — где уходит время: латентность хендлеров, походы в БД на апдейт, состояние кэшей
+#
+# setup_metrics(dp, public_router, mod_router):
+#   • dp.update (outer)      — открывает контекст апдейта: время старта и счётчики БД. Должен стоять
+#                              раньше FSMContextMiddleware, иначе чтение состояния FSM уйдёт в
+#                              "background": диспетчер создаётся с disable_fsm=True, а dp.fsm
+#                              подключается после setup_metrics (см. main.build_dispatcher);
+#   • роутеры (outer)        — по завершении обработанного апдейта пишут гистограммы;
+#   • роутеры (inner)        — запоминают имя сработавшего хендлера (до фильтров оно неизвестно).
+# БД считается через config.set_db_observer: каждый checkout соединения, execute/executemany
+# и время в SQLite (execute + fetch* + commit) относятся к текущему апдейту, а вне апдейтов —
+# к "background" (фоновые задачи, очередь, рассылки).
+# Экспорт: render_prometheus() (GET METRICS_PATH в webhook-режиме) и сводка в лог.
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from config import METRICS_LOG_INTERVAL, set_db_observer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+BACKGROUND = "background"
+
+
+class Histogram:
+    """Кумулятивная гистограмма в стиле Prometheus (фиксированные границы + sum/count)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает q-квантиль (оценка сверху)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self):
+        acc = 0
+        for bound, n in zip((*self.bounds, float("inf")), self.counts):
+            acc += n
+            yield bound, acc
+
+
+class UpdateStats:
+    __slots__ = ("started", "handler", "queries", "checkouts", "sqlite_seconds")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.handler: str | None = None
+        self.queries = 0
+        self.checkouts = 0
+        self.sqlite_seconds = 0.0
+
+
+_current: ContextVar[UpdateStats | None] = ContextVar("metrics_update", default=None)
+
+
+class HandlerMetrics:
+    __slots__ = ("latency", "queries", "checkouts", "sqlite_seconds", "errors")
+
+    def __init__(self) -> None:
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.checkouts = 0
+        self.sqlite_seconds = 0.0
+        self.errors = 0
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.handlers: dict[str, HandlerMetrics] = {}
+        self.db_queries = 0
+        self.db_checkouts = {"read": 0, "write": 0}
+        self.db_seconds = 0.0
+        self.background = UpdateStats()   # всё, что вне апдейтов
+        self._gauges: dict[str, Callable[[], dict]] = {}
+
+    # ---- наблюдатель для config.DbPool ----
+    def on_checkout(self, kind: str) -> None:
+        self.db_checkouts[kind] = self.db_checkouts.get(kind, 0) + 1
+        (_current.get() or self.background).checkouts += 1
+
+    def on_query(self, seconds: float) -> None:
+        self.db_queries += 1
+        self.db_seconds += seconds
+        st = _current.get() or self.background
+        st.queries += 1
+        st.sqlite_seconds += seconds
+
+    def on_time(self, seconds: float) -> None:
+        self.db_seconds += seconds
+        (_current.get() or self.background).sqlite_seconds += seconds
+
+    # ---- апдейты ----
+    def record(self, st: UpdateStats, error: bool = False) -> None:
+        name = st.handler or "unknown"
+        h = self.handlers.get(name)
+        if h is None:
+            h = self.handlers[name] = HandlerMetrics()
+        h.latency.observe(time.perf_counter() - st.started)
+        h.queries.observe(st.queries)
+        h.checkouts += st.checkouts
+        h.sqlite_seconds += st.sqlite_seconds
+        if error:
+            h.errors += 1
+
+    # ---- состояние кэшей/очередей: fn() -> dict (вложенные dict разворачиваются) ----
+    def register_gauges(self, name: str, fn: Callable[[], dict]) -> None:
+        self._gauges[name] = fn
+
+    def gauges(self) -> list[tuple[str, str, float]]:
+        out = []
+
+        def walk(source: str, prefix: str, d: dict) -> None:
+            for k, v in d.items():
+                field = f"{prefix}{k}"
+                if isinstance(v, dict):
+                    walk(source, field + ".", v)
+                elif isinstance(v, (int, float)):
+                    out.append((source, field, float(v)))
+
+        for name, fn in self._gauges.items():
+            try:
+                walk(name, "", fn())
+            except Exception as e:
+                print(f"[metrics] gauge {name} failed: {e!r}")
+        return out
+
+    # ---- экспорт ----
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE bot_handler_latency_seconds histogram",
+        ]
+        for name, h in sorted(self.handlers.items()):
+            for bound, acc in h.latency.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'bot_handler_latency_seconds_bucket{{handler="{name}",le="{le}"}} {acc}')
+            lines.append(f'bot_handler_latency_seconds_sum{{handler="{name}"}} {h.latency.sum:.6f}')
+            lines.append(f'bot_handler_latency_seconds_count{{handler="{name}"}} {h.latency.count}')
+        lines.append("# TYPE bot_handler_db_queries histogram")
+        for name, h in sorted(self.handlers.items()):
+            for bound, acc in h.queries.cumulative():
+                le = "+Inf" if bound == float("inf") else str(bound)
+                lines.append(f'bot_handler_db_queries_bucket{{handler="{name}",le="{le}"}} {acc}')
+            lines.append(f'bot_handler_db_queries_sum{{handler="{name}"}} {h.queries.sum:.0f}')
+            lines.append(f'bot_handler_db_queries_count{{handler="{name}"}} {h.queries.count}')
+        lines.append("# TYPE bot_handler_db_checkouts_total counter")
+        lines += [f'bot_handler_db_checkouts_total{{handler="{n}"}} {h.checkouts}' for n, h in sorted(self.handlers.items())]
+        lines.append("# TYPE bot_handler_sqlite_seconds_total counter")
+        lines += [f'bot_handler_sqlite_seconds_total{{handler="{n}"}} {h.sqlite_seconds:.6f}' for n, h in sorted(self.handlers.items())]
+        lines.append("# TYPE bot_handler_errors_total counter")
+        lines += [f'bot_handler_errors_total{{handler="{n}"}} {h.errors}' for n, h in sorted(self.handlers.items())]
+
+        lines.append("# TYPE bot_db_queries_total counter")
+        lines.append(f"bot_db_queries_total {self.db_queries}")
+        lines.append(f'bot_db_queries_total{{scope="{BACKGROUND}"}} {self.background.queries}')
+        lines.append("# TYPE bot_db_checkouts_total counter")
+        lines += [f'bot_db_checkouts_total{{kind="{k}"}} {v}' for k, v in self.db_checkouts.items()]
+        lines.append("# TYPE bot_db_seconds_total counter")
+        lines.append(f"bot_db_seconds_total {self.db_seconds:.6f}")
+
+        lines.append("# TYPE bot_component gauge")
+        lines += [f'bot_component{{component="{src}",field="{field}"}} {value:g}' for src, field, value in self.gauges()]
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self, top: int = 15) -> list[str]:
+        rows = sorted(self.handlers.items(), key=lambda kv: kv[1].latency.sum, reverse=True)[:top]
+        out = []
+        for name, h in rows:
+            n = h.latency.count or 1
+            out.append(
+                f"{name}: n={h.latency.count} avg={h.latency.sum / n * 1e3:.1f}ms "
+                f"p50<={h.latency.quantile(0.5) * 1e3:g}ms p99<={h.latency.quantile(0.99) * 1e3:g}ms "
+                f"db={h.queries.sum / n:.1f}q/{h.checkouts / n:.1f}conn/{h.sqlite_seconds / n * 1e3:.2f}ms per update"
+                + (f" errors={h.errors}" if h.errors else "")
+            )
+        out.append(
+            f"db total: {self.db_queries} queries, checkouts {self.db_checkouts}, "
+            f"{self.db_seconds:.2f}s in sqlite; background {self.background.queries} queries"
+        )
+        return out
+
+    async def log_loop(self, interval: float = METRICS_LOG_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for line in self.summary_lines():
+                print(f"[metrics] {line}")
+
+
+METRICS = Metrics()
+
+
+# ===========================
+# Middleware
+# ===========================
+class UpdateContextMiddleware(BaseMiddleware):
+    """dp.update (outer): контекст апдейта открывается до FSM и роутеров."""
+
+    async def __call__(self, handler, event, data):
+        token = _current.set(UpdateStats())
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Outer на событиях роутера: пишет метрики, если апдейт обработан этим роутером."""
+
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        st = _current.get()
+        token = None
+        if st is None:   # без UpdateContextMiddleware — считаем от входа в роутер
+            st = UpdateStats()
+            token = _current.set(st)
+        try:
+            result = await handler(event, data)
+        except Exception:
+            self.metrics.record(st, error=True)
+            raise
+        finally:
+            if token is not None:
+                _current.reset(token)
+        if result is not UNHANDLED:
+            self.metrics.record(st)
+        return result
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner: к этому моменту фильтры пройдены и известен конкретный хендлер."""
+
+    async def __call__(self, handler, event, data):
+        st = _current.get()
+        h = data.get("handler")
+        if st is not None and h is not None:
+            st.handler = getattr(h.callback, "__name__", None) or repr(h.callback)
+        return await handler(event, data)
+
+
+def setup_metrics(dp: Dispatcher, *routers: Router, metrics: Metrics = METRICS) -> Metrics:
+    if dp.fsm in dp.update.outer_middleware:
+        raise RuntimeError("setup_metrics: FSM уже подключён — Dispatcher(disable_fsm=True), dp.fsm после метрик")
+    set_db_observer(metrics)
+    dp.update.outer_middleware(UpdateContextMiddleware())
+    for router in routers:
+        for observer in (router.message, router.callback_query, router.inline_query):
+            observer.outer_middleware(HandlerTimingMiddleware(metrics))
+            observer.middleware(HandlerNameMiddleware())
+    return metrics
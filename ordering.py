@@ -0,0 +1,89 @@
+# ordering.py — входящие апдейты: по очереди для одного пользователя, параллельно для разных
+#
+# Polling (handle_as_tasks) и webhook обрабатывают апдейты конкурентно, и два быстрых нажатия
+# одного человека (например, «Отправить на модерацию») выполняются одновременно: оба читают один
+# и тот же черновик из FSM. Очередь по ключу даёт сам aiogram: FSMContextMiddleware держит
+# events_isolation.lock(ключ FSM) от чтения состояния до конца хендлеров, поэтому следующий апдейт
+# ключа видит состояние уже после предыдущего. ReleasingEventIsolation — это SimpleEventIsolation,
+# который забывает замок ключа, когда его никто не держит и не ждёт (в aiogram словарь замков
+# только растёт). ConcurrencyLimitMiddleware ограничивает, сколько апдейтов одновременно в
+# хендлерах; он стоит после dp.fsm, т.е. внутри замка ключа, и ждущие своей очереди слот не занимают.
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+
+from config import UPDATE_CONCURRENCY
+
+
+class ReleasingEventIsolation(SimpleEventIsolation):
+    def __init__(self) -> None:
+        super().__init__()
+        self._refs: dict[Hashable, int] = {}   # держит + ждут, по ключу
+        self.queued = 0        # ждут предыдущий апдейт своего ключа
+        self.serialized = 0    # сколько всего апдейтов ждали свой ключ
+        self.max_depth = 0     # самая длинная очередь одного ключа
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        refs = self._refs[key] = self._refs.get(key, 0) + 1
+        if refs > 1:
+            self.serialized += 1
+            self.max_depth = max(self.max_depth, refs)
+        try:
+            self.queued += 1
+            lock = self._locks[key]
+            try:
+                await lock.acquire()   # очередь ожидающих у asyncio.Lock — FIFO
+            finally:
+                self.queued -= 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._refs[key] -= 1
+            if not self._refs[key]:
+                del self._refs[key]
+                del self._locks[key]
+
+    async def close(self) -> None:
+        await super().close()
+        self._refs.clear()
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._locks),
+            "queued": self.queued,
+            "serialized": self.serialized,
+            "max_depth": self.max_depth,
+        }
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """dp.update (outer), после dp.fsm: не больше limit апдейтов одновременно в хендлерах."""
+
+    def __init__(self, limit: int = UPDATE_CONCURRENCY) -> None:
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self.running = 0
+        self.waiting = 0
+
+    async def __call__(self, handler, event, data):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "running": self.running, "waiting": self.waiting}
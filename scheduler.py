@@ -0,0 +1,175 @@
+# scheduler.py — фоновые задачи обслуживания внутри процесса бота (asyncio, без cron)
+#
+# Scheduler крутит каждую задачу в своём цикле с интервалом; задача возвращает число
+# затронутых строк, планировщик пишет в лог строки и длительность. Задачи чистки работают
+# пачками по MAINTENANCE_BATCH строк — каждая пачка в своей транзакции, между пачками
+# писатель отпускается, и хендлеры не ждут за одной большой транзакцией.
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from config import (
+    REQUEST_PENDING_TTL_DAYS, REQUEST_APPROVED_TTL_DAYS, ARCHIVE_AFTER_DAYS, MAINTENANCE_BATCH,
+    JOB_EXPIRE_INTERVAL, JOB_ARCHIVE_INTERVAL, JOB_FSM_PURGE_INTERVAL,
+    REQUEST_COLUMNS, OFFER_COLUMNS, db_write,
+)
+
+JobFn = Callable[[], Awaitable[int]]
+
+
+class Job:
+    __slots__ = ("name", "interval", "fn", "runs", "rows", "last_rows", "last_duration", "last_error")
+
+    def __init__(self, name: str, interval: float, fn: JobFn) -> None:
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.runs = 0
+        self.rows = 0
+        self.last_rows = 0
+        self.last_duration = 0.0
+        self.last_error: str | None = None
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self.jobs: list[Job] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, fn: JobFn) -> None:
+        self.jobs.append(Job(name, interval, fn))
+
+    async def run_job(self, job: Job) -> int:
+        t0 = time.perf_counter()
+        try:
+            rows = await job.fn()
+            job.last_error = None
+        except Exception as e:
+            rows = 0
+            job.last_error = repr(e)
+            print(f"[jobs] {job.name} failed: {e!r}")
+        job.runs += 1
+        job.rows += rows
+        job.last_rows = rows
+        job.last_duration = time.perf_counter() - t0
+        print(f"[jobs] {job.name}: {rows} row(s) in {job.last_duration * 1e3:.0f} ms")
+        return rows
+
+    async def _loop(self, job: Job, delay: float) -> None:
+        # разнесём первые запуски, чтобы задачи не стартовали одновременно с ботом и друг с другом
+        await asyncio.sleep(delay)
+        while True:
+            await self.run_job(job)
+            await asyncio.sleep(job.interval)
+
+    def start(self, first_delay: float = 30.0) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._loop(job, first_delay * (i + 1)))
+                           for i, job in enumerate(self.jobs)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            job.name: {"runs": job.runs, "rows": job.rows, "last_rows": job.last_rows,
+                       "last_ms": round(job.last_duration * 1e3, 1), "last_error": job.last_error}
+            for job in self.jobs
+        }
+
+
+# ===========================
+# Задачи
+# ===========================
+def _days_ago(days: int) -> str:
+    # created_at/moderated_at — utcnow().isoformat(), строки сравниваются как даты
+    return (datetime.utcnow() - timedelta(days=days)).isoformat()
+
+
+async def _batched(step: Callable[[], Awaitable[int]], batch: int) -> int:
+    """Повторяет step (одна пачка = одна транзакция), пока пачка полная."""
+    total = 0
+    while True:
+        n = await step()
+        total += n
+        if n < batch:
+            return total
+        await asyncio.sleep(0)   # отпускаем писателя между пачками
+
+
+async def expire_stale_requests(batch: int = MAINTENANCE_BATCH) -> int:
+    """pending старше REQUEST_PENDING_TTL_DAYS -> expired, approved старше REQUEST_APPROVED_TTL_DAYS -> closed."""
+    now = datetime.utcnow().isoformat()
+
+    async def expire_pending() -> int:
+        async with db_write() as db:
+            cur = await db.execute(
+                "UPDATE requests SET status='expired', closed_at=? WHERE id IN ("
+                " SELECT id FROM requests WHERE status='pending' AND created_at<? LIMIT ?)",
+                (now, _days_ago(REQUEST_PENDING_TTL_DAYS), batch)
+            )
+            return cur.rowcount
+
+    async def close_approved() -> int:
+        async with db_write() as db:
+            cur = await db.execute(
+                "UPDATE requests SET status='closed', closed_at=? WHERE id IN ("
+                " SELECT id FROM requests WHERE status='approved'"
+                "    AND COALESCE(moderated_at, created_at)<? LIMIT ?)",
+                (now, _days_ago(REQUEST_APPROVED_TTL_DAYS), batch)
+            )
+            return cur.rowcount
+
+    return await _batched(expire_pending, batch) + await _batched(close_approved, batch)
+
+
+async def archive_closed_requests(batch: int = MAINTENANCE_BATCH) -> int:
+    """Закрытые заявки старше ARCHIVE_AFTER_DAYS вместе с откликами -> архивная БД (схема archive)."""
+    cutoff = _days_ago(ARCHIVE_AFTER_DAYS)
+    # транзакция захватывает обе БД; в WAL каждая коммитится атомарно сама по себе, поэтому
+    # после сбоя строка может остаться и в bot.db — следующий проход перезапишет её (OR REPLACE)
+
+    async def step() -> int:
+        async with db_write() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute(
+                "SELECT id FROM requests WHERE status IN ('expired', 'closed', 'rejected')"
+                " AND COALESCE(closed_at, moderated_at, created_at)<? LIMIT ?",
+                (cutoff, batch)
+            )
+            ids = [r["id"] for r in await cur.fetchall()]
+            if not ids:
+                return 0
+            marks = ",".join("?" * len(ids))
+            await db.execute(
+                f"INSERT OR REPLACE INTO archive.requests_archive ({REQUEST_COLUMNS}, archived_at) "
+                f"SELECT {REQUEST_COLUMNS}, ? FROM main.requests WHERE id IN ({marks})",
+                (datetime.utcnow().isoformat(), *ids)
+            )
+            await db.execute(
+                f"INSERT OR REPLACE INTO archive.offers_archive ({OFFER_COLUMNS}) "
+                f"SELECT {OFFER_COLUMNS} FROM main.offers WHERE request_id IN ({marks})", ids
+            )
+            await db.execute(f"DELETE FROM offers WHERE request_id IN ({marks})", ids)
+            await db.execute(f"DELETE FROM broadcast_recipients WHERE request_id IN ({marks})", ids)
+            await db.execute(f"DELETE FROM broadcasts WHERE request_id IN ({marks})", ids)
+            await db.execute(f"DELETE FROM requests WHERE id IN ({marks})", ids)
+            return len(ids)
+
+    return await _batched(step, batch)
+
+
+def build_maintenance_scheduler(fsm_storage=None) -> Scheduler:
+    """Набор задач для main(): сроки заявок, архив, протухшие FSM-черновики (если SqliteStorage)."""
+    sched = Scheduler()
+    sched.add("expire_requests", JOB_EXPIRE_INTERVAL, expire_stale_requests)
+    sched.add("archive_requests", JOB_ARCHIVE_INTERVAL, archive_closed_requests)
+    purge = getattr(fsm_storage, "purge_expired", None)
+    if purge is not None:
+        sched.add("purge_fsm_drafts", JOB_FSM_PURGE_INTERVAL,
+                  lambda: _batched(lambda: purge(MAINTENANCE_BATCH), MAINTENANCE_BATCH))
+    return sched
@@ -0,0 +1,211 @@
+# sender.py — исходящие вызовы Telegram: лимиты (token bucket), retry_after, фоновая очередь
+#
+# RateLimitMiddleware вешается на bot.session: глобальный лимит — на каждый вызов, лимит на чат —
+# только в фоновых задачах, помеченных mark_background() (OUTBOX, рассылка, публикация в канал).
+# Ответы и правки в хендлерах по лимиту чата не ждут: апдейт держит замок пользователя и слот
+# ConcurrencyLimitMiddleware, а колбэк надо успеть ответить. На 429 ждёт retry_after и повторяет.
+# OutboundQueue — для неинтерактивных уведомлений (автору, в модерацию): хендлер кладёт
+# задачу и сразу отвечает пользователю, а воркеры отправляют с повторами.
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+from cache import TtlLruCache
+from config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST,
+    OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST, OUTBOUND_GROUP_RATE, OUTBOUND_GROUP_BURST,
+    OUTBOUND_MAX_RETRIES, OUTBOUND_WORKERS, OUTBOUND_QUEUE_SIZE,
+)
+
+
+_background: ContextVar[bool] = ContextVar("outbound_background", default=False)
+
+
+def mark_background() -> None:
+    """В начале фоновой задачи: её вызовы с chat_id ждут ещё и лимит своего чата."""
+    _background.set(True)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst про запас. reserve() не ждёт, а говорит сколько ждать."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Глобальный bucket + bucket на каждый чат (личка и группы/каналы — разные лимиты)."""
+
+    def __init__(self) -> None:
+        self.global_bucket = TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST)
+        # полный bucket равен отсутствующему, поэтому давно не писавшие чаты можно вытеснять
+        self._chats = TtlLruCache(50_000, ttl=600)
+        self.waited = 0.0
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = (TokenBucket(OUTBOUND_GROUP_RATE, OUTBOUND_GROUP_BURST) if is_group
+                      else TokenBucket(OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST))
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def acquire(self, chat_id: int | str | None) -> None:
+        wait = self.global_bucket.reserve()
+        if chat_id is not None:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        if wait > 0:
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def block(self, chat_id: int | str | None, seconds: float) -> None:
+        (self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket).block(seconds)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: RateLimiter, max_retries: int = OUTBOUND_MAX_RETRIES) -> None:
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.flood_waits = 0
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        throttled = chat_id if _background.get() else None
+        attempt = 0
+        while True:
+            await self.limiter.acquire(throttled)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.flood_waits += 1
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                print(f"[outbound] 429 on {method.__api_method__} chat={chat_id}: retry in {e.retry_after}s")
+                if chat_id is not None:
+                    self.limiter.block(chat_id, e.retry_after)   # фон в этот чат тоже подождёт
+                if throttled is None:
+                    # ждёт только этот вызов, остальным глобальный bucket не блокируем
+                    await asyncio.sleep(e.retry_after)
+
+
+SendFactory = Callable[[], Awaitable]
+
+
+class OutboundQueue:
+    """
+    Фоновая отправка: submit(lambda: bot.send_message(...)) — фабрика, а не корутина,
+    чтобы при повторе создать вызов заново. Сетевые/5xx ошибки — повтор с экспоненциальной
+    паузой, остальные ошибки API (бот заблокирован, чат не найден…) — в лог и дальше.
+    """
+
+    def __init__(self, workers: int = OUTBOUND_WORKERS, maxsize: int = OUTBOUND_QUEUE_SIZE,
+                 max_retries: int = OUTBOUND_MAX_RETRIES) -> None:
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue[tuple[SendFactory, str, int]] = asyncio.Queue(maxsize)
+        self._tasks: list[asyncio.Task] = []
+        self._delayed: set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def submit(self, factory: SendFactory, label: str = "") -> bool:
+        try:
+            self._queue.put_nowait((factory, label, 0))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"[outbound] queue full, dropped: {label}")
+            return False
+
+    async def _retry_later(self, factory: SendFactory, label: str, attempt: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self._queue.put((factory, label, attempt))
+
+    async def _worker(self) -> None:
+        mark_background()
+        while True:
+            factory, label, attempt = await self._queue.get()
+            try:
+                await factory()
+                self.sent += 1
+            except (TelegramRetryAfter, TelegramNetworkError, TelegramServerError) as e:
+                if attempt < self.max_retries:
+                    self.retried += 1
+                    delay = getattr(e, "retry_after", None) or min(60.0, 2 ** attempt + random.random())
+                    t = asyncio.create_task(self._retry_later(factory, label, attempt + 1, delay))
+                    self._delayed.add(t)
+                    t.add_done_callback(self._delayed.discard)
+                else:
+                    self.failed += 1
+                    print(f"[outbound] gave up after {attempt + 1} attempts: {label}: {e}")
+            except TelegramAPIError as e:
+                self.failed += 1
+                print(f"[outbound] {label}: {e}")
+            except Exception as e:
+                self.failed += 1
+                print(f"[outbound] {label} crashed: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _drain(self) -> None:
+        while True:
+            await self._queue.join()
+            if not self._delayed:
+                return
+            await asyncio.wait(set(self._delayed))
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается очереди и отложенных повторов (до timeout секунд) и гасит воркеров."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                print(f"[outbound] {self._queue.qsize()} message(s) left unsent on shutdown")
+        if self._delayed:
+            print(f"[outbound] {len(self._delayed)} retry(ies) cancelled on shutdown")
+        for t in [*self._tasks, *self._delayed]:
+            t.cancel()
+        await asyncio.gather(*self._tasks, *self._delayed, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "delayed": len(self._delayed),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,127 @@
+# webhook_server.py — режим webhook (RUN_MODE = "webhook"): aiohttp-сервер вместо start_polling
+import asyncio
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import (
+    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_SET_ON_START, WEBHOOK_DRAIN_TIMEOUT, METRICS_ENABLED, METRICS_PATH,
+)
+from metrics import METRICS
+
+HEALTH_PATH = "/healthz"
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Отвечает Telegram сразу, апдейт обрабатывается в фоне (как SimpleRequestHandler).
+    При остановке новые апдейты получают 503 (Telegram их повторит позже/другому воркеру),
+    а уже принятые дорабатываются — до drain_timeout секунд.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str | None,
+                 drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT, **data) -> None:
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.received = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="draining")
+        self.received += 1
+        return await super().handle(request)
+
+    async def drain(self) -> None:
+        self.draining = True
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        print(f"[webhook] draining {len(tasks)} in-flight update(s)…")
+        _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            print(f"[webhook] {len(pending)} update(s) not finished in {self.drain_timeout}s, cancelling")
+            for t in pending:
+                t.cancel()
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+async def _health(request: web.Request) -> web.Response:
+    handler: DrainingRequestHandler = request.app["webhook_handler"]
+    return web.json_response(
+        {
+            "status": "draining" if handler.draining else "ok",
+            "in_flight": handler.in_flight,
+            "received": handler.received,
+        },
+        status=503 if handler.draining else 200,
+    )
+
+
+async def _metrics(request: web.Request) -> web.Response:
+    handler: DrainingRequestHandler = request.app["webhook_handler"]
+    text = METRICS.render_prometheus() + (
+        f"# TYPE bot_webhook_in_flight gauge\nbot_webhook_in_flight {handler.in_flight}\n"
+        f"# TYPE bot_webhook_received_total counter\nbot_webhook_received_total {handler.received}\n"
+    )
+    return web.Response(text=text, content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, secret_token: str | None = WEBHOOK_SECRET,
+                      **data) -> web.Application:
+    app = web.Application()
+    handler = DrainingRequestHandler(dp, bot, secret_token=secret_token or None, **data)
+    handler.register(app, path=WEBHOOK_PATH)
+    app["webhook_handler"] = handler
+    app.router.add_get(HEALTH_PATH, _health)
+    if METRICS_ENABLED:
+        app.router.add_get(METRICS_PATH, _metrics)
+    setup_application(app, dp, bot=bot, **data)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **data) -> None:
+    """Поднимает сервер и ждёт SIGINT/SIGTERM; при остановке дорабатывает принятые апдейты."""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Укажи секрет в config.py -> WEBHOOK_SECRET (нужен для режима webhook)")
+
+    app = build_webhook_app(dp, bot, **data)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    print(f"[webhook] listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH} (health: {HEALTH_PATH})")
+
+    try:
+        if WEBHOOK_SET_ON_START:
+            if not WEBHOOK_BASE_URL:
+                raise RuntimeError("Укажи WEBHOOK_BASE_URL в config.py (или выключи WEBHOOK_SET_ON_START)")
+            await bot.set_webhook(
+                url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+        await stop.wait()
+        print("[webhook] stopping…")
+    finally:
+        # on_shutdown приложения: DrainingRequestHandler.close() -> drain
+        await runner.cleanup()